@@ -1,3 +1,5 @@
 """ MC10 data manipulation tool """
 
 from .session import Session
+from .s3context import S3Context
+from .study import Study
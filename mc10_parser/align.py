@@ -0,0 +1,93 @@
+""" Vectorized alignment of MC10 sensor streams onto a common time grid """
+
+import numpy as np
+
+from .chunks import CHUNK_ROWS
+
+METHODS = ['nearest', 'linear']
+
+
+def uniform_grid(start, end, rate):
+    """ Returns int64 UTC microsecond times from start to end at rate Hz. """
+    period = 10**6 / rate
+    n = int((end - start) // period) + 1
+    return start + np.round(np.arange(n) * period).astype(np.int64)
+
+
+def interpolate(
+    ts, values, grid, method='nearest', tolerance=None, out=None,
+    rows=CHUNK_ROWS
+):
+    """ Samples a stream at grid times.
+
+    Grid times before the first or after the last sample, or further than
+    tolerance from the nearest sample, are set to NaN. The grid is
+    processed rows at a time so temporaries stay small.
+
+    Parameters:
+        ts (np.ndarray): Sorted int64 UTC microsecond sample times.
+        values (np.ndarray): (samples, columns) value matrix.
+        grid (np.ndarray): Sorted int64 UTC microsecond times to sample at.
+
+    Keyword Arguments:
+        method (string): 'nearest' sample or 'linear' interpolation.
+        tolerance (int): Largest distance in microseconds to the nearest
+            sample, None for no limit.
+        out (np.ndarray): (len(grid), columns) float matrix to write into.
+        rows (int): Grid times processed per chunk.
+
+    Returns:
+        np.ndarray: (len(grid), columns) sampled values.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}.")
+    values = values.reshape(len(ts), -1)
+    if out is None:
+        out = np.full(
+            (len(grid), values.shape[1]), np.nan,
+            dtype=np.promote_types(values.dtype, np.float32)
+        )
+    if not len(ts):
+        return out
+
+    last = len(ts) - 1
+    lo = np.searchsorted(grid, ts[0], side='left')
+    hi = np.searchsorted(grid, ts[-1], side='right')
+    for i in range(lo, hi, rows):
+        g = grid[i:min(i + rows, hi)]
+        # ts[left] <= g <= ts[right]
+        right = np.minimum(np.searchsorted(ts, g, side='left'), last)
+        left = np.where(ts[right] == g, right, np.maximum(right - 1, 0))
+        before = g - ts[left]
+        after = ts[right] - g
+        if method == 'nearest':
+            # ties go to the later sample, as in pandas reindex
+            chunk = values[np.where(after <= before, right, left)]
+        else:
+            span = ts[right] - ts[left]
+            w = before / np.where(span > 0, span, 1)
+            chunk = values[left] + \
+                (values[right] - values[left]) * w[:, np.newaxis]
+        if tolerance is not None:
+            chunk = chunk.astype(out.dtype, copy=False)
+            chunk[np.minimum(before, after) > tolerance] = np.nan
+        out[i:i + len(g)] = chunk
+    return out
+
+
+def column_names(label, t, columns, accel_labels=None):
+    """ Returns the aligned frame column names of one folder/type.
+
+    Accel columns are named <label>_<axis>, other types <label>_<type>_<axis>
+    or <label>_<type> when they have a single column. Axes are taken from
+    accel_labels when it matches the number of columns.
+    """
+    if accel_labels and len(accel_labels) == len(columns):
+        axes = list(accel_labels)
+    else:
+        axes = list(columns)
+    if t == 'accel':
+        return [f"{label}_{a}" for a in axes]
+    if len(axes) == 1:
+        return [f"{label}_{t}"]
+    return [f"{label}_{t}_{a}" for a in axes]
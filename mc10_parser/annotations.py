@@ -0,0 +1,110 @@
+""" Interval index over MC10 annotations """
+
+import numpy as np
+
+from .times import timestamp_to_us, us_to_index
+
+START = 'Start Timestamp (ms)'
+STOP = 'Stop Timestamp (ms)'
+NAME = 'EventType'
+UNITS = {'us': 1, 'ms': 10**3, 's': 10**6}
+
+
+def to_us(t, tz):
+    """ Returns int64 UTC microseconds for an int or a timestamp. """
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    return timestamp_to_us(t, tz)
+
+
+class AnnotationIndex:
+    """ Annotations as sorted int64 intervals for fast time queries.
+
+    Start and stop times are kept as int64 UTC microseconds sorted by
+    start, so overlap queries and sensor data extraction for many
+    annotations are a few vectorized searches instead of one boolean mask
+    over the data per annotation.
+    """
+
+    def __init__(self, anns, tz, start=START, stop=STOP, name=NAME, unit='ms'):
+        """ Initialize AnnotationIndex.
+
+        Parameters:
+            anns (DataFrame): Session annotations.
+            tz (pytz.timezone): Timezone for naive query times and results.
+
+        Keyword Arguments:
+            start (string): Column of annotation start times.
+            stop (string): Column of annotation stop times.
+            name (string): Column of annotation names.
+            unit (string): Unit of the time columns, 'ms', 'us' or 's'.
+        """
+        frame = anns.reset_index()
+        starts = frame[start].to_numpy(dtype=np.int64) * UNITS[unit]
+        stops = frame[stop].to_numpy(dtype=np.int64) * UNITS[unit]
+        order = np.argsort(starts, kind='stable')
+        self.frame = frame.iloc[order].reset_index(drop=True)
+        self.starts = starts[order]
+        self.stops = stops[order]
+        self.names = frame[name].to_numpy()[order]
+        self.tz = tz
+        # bounds how far before a query an overlapping interval can start
+        self.max_length = int((self.stops - self.starts).max()) \
+            if len(order) else 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def positions(self, name=None):
+        """ Returns the sorted positions of annotations called name. """
+        if name is None:
+            return np.arange(len(self))
+        return np.flatnonzero(self.names == name)
+
+    def overlapping(self, start, end, name=None):
+        """ Returns the annotations overlapping start <= t <= end.
+
+        Naive times are taken to be in the index timezone; ints are UTC
+        microseconds.
+
+        Returns:
+            DataFrame: Matching annotation rows, in start order.
+        """
+        start, end = to_us(start, self.tz), to_us(end, self.tz)
+        lo = np.searchsorted(self.starts, start - self.max_length, 'left')
+        hi = np.searchsorted(self.starts, end, 'right')
+        hits = lo + np.flatnonzero(self.stops[lo:hi] >= start)
+        if name is not None:
+            hits = hits[self.names[hits] == name]
+        return self.frame.iloc[hits]
+
+    def intervals(self, name=None):
+        """ Returns (starts, stops) tz-aware indexes of annotations. """
+        i = self.positions(name)
+        return (
+            us_to_index(self.starts[i], self.tz),
+            us_to_index(self.stops[i], self.tz)
+        )
+
+    def extract(self, stream, name=None, before=0, after=0):
+        """ Returns the stream data within each annotation called name.
+
+        Stream positions of every annotation are found with two batched
+        searches, then each annotation's rows are cut out as a view.
+
+        Parameters:
+            stream (SegmentedStream): Stream to extract from.
+
+        Keyword Arguments:
+            name (string): Annotation name, None for all annotations.
+            before (int): Microseconds of padding before each start.
+            after (int): Microseconds of padding after each stop.
+
+        Returns:
+            list of SegmentedStreams: Data of each annotation from
+                start - before to stop + after, in start order.
+        """
+        i = self.positions(name)
+        lo = stream.positions_of(self.starts[i] - before, side='left')
+        hi = stream.positions_of(self.stops[i] + after, side='right')
+        return [stream.iloc(a, b) for a, b in zip(lo, hi)]
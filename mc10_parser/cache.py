@@ -0,0 +1,176 @@
+""" Binary sidecar cache for MC10 sensor CSVs """
+
+import hashlib
+import json
+import numpy as np
+import os
+
+MAGIC = b'MC10CACH'
+VERSION = 1
+EXTENSION = '.mc10cache'
+HEADER_BLOCK = 4096
+
+
+def cache_path(data_loc, cache_dir=None):
+    """ Returns the cache file location for the CSV at data_loc.
+
+    Caches sit next to the CSV (<folder>/<type>.mc10cache) unless a
+    cache_dir is given, in which case they are named by a hash of the CSV's
+    absolute path inside cache_dir.
+    """
+    if cache_dir is None:
+        return os.path.splitext(data_loc)[0] + EXTENSION
+    key = hashlib.sha1(os.path.abspath(data_loc).encode()).hexdigest()
+    return os.path.join(cache_dir, key + EXTENSION)
+
+
+def file_hash(filepath, block_size=1 << 20):
+    """ Returns a blake2b hex digest of the file contents at filepath. """
+    h = hashlib.blake2b(digest_size=20)
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_key(data_loc, content_hash=True):
+    """ Returns the size, mtime and (optionally) hash keying data_loc. """
+    st = os.stat(data_loc)
+    key = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if content_hash:
+        key['hash'] = file_hash(data_loc)
+    return key
+
+
+def _header_bytes(header):
+    """ Serializes header, padded to a multiple of HEADER_BLOCK. """
+    raw = json.dumps(header).encode()
+    size = len(MAGIC) + 8 + len(raw)
+    size += -size % HEADER_BLOCK
+    return MAGIC + np.uint64(size).tobytes() + raw.ljust(
+        size - len(MAGIC) - 8
+    )
+
+
+def _read_header(path):
+    """ Returns (header dict, header size) of the cache file at path. """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an MC10 cache file.")
+        size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        return json.loads(f.read(size - len(MAGIC) - 8)), size
+
+
+def write(path, source, ts, values, columns, index_name):
+    """ Writes timestamps and values to a cache file at path.
+
+    Parameters:
+        path (string): Cache file to write.
+        source (dict): Key of the source CSV, from source_key.
+        ts (np.ndarray): int64 UTC microsecond timestamps.
+        values (np.ndarray): (rows, columns) sensor value matrix.
+        columns (list of strings): Value column names.
+        index_name (string): Timestamp column name.
+    """
+    values = np.asarray(values)
+    header = {
+        'version': VERSION,
+        'source': source,
+        'rows': len(ts),
+        'columns': list(columns),
+        'index_name': index_name,
+        'dtype': values.dtype.str,
+    }
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_header_bytes(header))
+        f.write(np.ascontiguousarray(ts, dtype=np.int64).tobytes())
+        # values are stored column-major so each column is contiguous
+        f.write(np.ascontiguousarray(values.T).tobytes())
+    os.replace(tmp_path, path)
+
+
+def read(path, data_loc, dtype=None):
+    """ Memory-maps a cache file if it is still valid for data_loc.
+
+    The cache is valid when it holds values of dtype, the source size
+    matches and either its mtime matches or, after a touch, its content
+    hash does.
+
+    Keyword Arguments:
+        dtype (np.dtype): Value dtype the cache must hold, any if None.
+
+    Returns:
+        tuple or None: (timestamps, values, columns, index name), or None
+            if the cache is missing or stale.
+    """
+    try:
+        header, offset = _read_header(path)
+    except (OSError, ValueError):
+        return None
+    if header.get('version') != VERSION:
+        return None
+    if dtype is not None and np.dtype(header['dtype']) != np.dtype(dtype):
+        return None
+
+    cached = header['source']
+    current = source_key(data_loc, content_hash=False)
+    if current['size'] != cached['size']:
+        return None
+    if current['mtime_ns'] != cached['mtime_ns']:
+        if file_hash(data_loc) != cached['hash']:
+            return None
+        # contents unchanged, so refresh the mtime kept in the header
+        header['source']['mtime_ns'] = current['mtime_ns']
+        raw = _header_bytes(header)
+        if len(raw) == offset:
+            with open(path, 'r+b') as f:
+                f.write(raw)
+
+    # the cache file's own mtime doubles as its last-used time for eviction
+    os.utime(path)
+
+    rows = header['rows']
+    ts = np.memmap(path, dtype=np.int64, mode='c', offset=offset, shape=rows)
+    values = np.memmap(
+        path,
+        dtype=np.dtype(header['dtype']),
+        mode='c',
+        offset=offset + 8 * rows,
+        shape=(len(header['columns']), rows)
+    ).T
+    return ts, values, header['columns'], header['index_name']
+
+
+def invalidate(data_loc, cache_dir=None):
+    """ Removes the cache file for data_loc, if any. """
+    try:
+        os.remove(cache_path(data_loc, cache_dir))
+    except FileNotFoundError:
+        pass
+
+
+def evict(cache_dir, max_bytes):
+    """ Deletes least recently used caches until cache_dir fits max_bytes. """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(EXTENSION):
+            path = os.path.join(cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(e[1] for e in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,121 @@
+""" Chunked, bounded-memory iteration over MC10 sensor streams """
+
+import numpy as np
+import pandas as pd
+from pytz import utc
+
+from . import codec
+from .dataio import open_stream, read_header, read_stream
+from .times import index_to_us, us_to_index
+
+CHUNK_ROWS = 1 << 16
+
+
+def to_duration_us(duration):
+    """ Returns duration in microseconds; numbers are taken as seconds. """
+    if isinstance(duration, (int, float)):
+        duration = pd.Timedelta(seconds=duration)
+    return pd.Timedelta(duration).value // 1000
+
+
+def iter_stream(
+    data_loc, tz, rows=CHUNK_ROWS, s3_creds=None, parser='pandas',
+    precision='float64'
+):
+    """ Yields an MC10 CSV as DataFrames of up to rows rows.
+
+    Binary codec streams are decoded whole, then yielded as views.
+
+    Parameters:
+        data_loc (string or file): Path, S3 key or buffer holding the CSV.
+        tz (pytz.timezone): Timezone to convert the UTC index to.
+
+    Keyword Arguments:
+        rows (int): Rows parsed per chunk.
+        s3_creds (dict): S3 credentials, set when data_loc is an S3 key.
+        parser (string): 'pandas' or 'mc10' typed parser.
+        precision (string): Sensor value dtype for the 'mc10' parser.
+    """
+    with open_stream(data_loc, s3_creds) as f:
+        if codec.is_encoded(f):
+            yield from iter_frame(
+                read_stream(f, tz, parser=parser, precision=precision), rows
+            )
+        elif parser == 'mc10':
+            columns = read_header(f)
+            dtypes = {c: precision for c in columns[1:]}
+            dtypes[columns[0]] = np.int64
+            reader = pd.read_csv(
+                f, dtype=dtypes, index_col=0, chunksize=rows, engine='c'
+            )
+            for df in reader:
+                df.index = us_to_index(df.index.values, tz, name=columns[0])
+                yield df
+        elif parser == 'pandas':
+            for df in pd.read_csv(f, chunksize=rows):
+                df.set_index(df.columns[0], inplace=True)
+                df.index = pd.to_datetime(df.index, unit='us')
+                df.index = df.index.tz_localize(utc).tz_convert(tz)
+                yield df
+        else:
+            raise ValueError(f"Unknown parser {parser}.")
+
+
+def rechunk_rows(chunks, rows):
+    """ Regroups DataFrame chunks into chunks of exactly rows rows.
+
+    The last chunk holds whatever rows remain.
+    """
+    pending = []
+    n = 0
+    for df in chunks:
+        while len(df):
+            part = df.iloc[:rows - n]
+            df = df.iloc[len(part):]
+            pending.append(part)
+            n += len(part)
+            if n == rows:
+                yield pending[0] if len(pending) == 1 else pd.concat(pending)
+                pending = []
+                n = 0
+    if pending:
+        yield pending[0] if len(pending) == 1 else pd.concat(pending)
+
+
+def rechunk_duration(chunks, duration):
+    """ Regroups DataFrame chunks into consecutive windows of duration.
+
+    Windows are aligned to the first timestamp. Windows without samples
+    are skipped.
+
+    Parameters:
+        chunks (iterable of DataFrames): Time ordered chunks.
+        duration (int): Window length in microseconds.
+    """
+    origin = None
+    current = None
+    pending = []
+    for df in chunks:
+        if not len(df):
+            continue
+        ts = index_to_us(df.index)
+        if origin is None:
+            origin = ts[0]
+        bins = (ts - origin) // duration
+        edges = np.flatnonzero(np.diff(bins)) + 1
+        starts = np.concatenate(([0], edges))
+        ends = np.concatenate((edges, [len(df)]))
+        for start, end in zip(starts, ends):
+            if bins[start] != current and pending:
+                yield pending[0] if len(pending) == 1 else pd.concat(pending)
+                pending = []
+            current = bins[start]
+            pending.append(df.iloc[start:end])
+    if pending:
+        yield pending[0] if len(pending) == 1 else pd.concat(pending)
+
+
+def iter_frame(df, rows=CHUNK_ROWS):
+    """ Yields an in-memory DataFrame as views of up to rows rows. """
+    for i in range(0, len(df), rows):
+        yield df.iloc[i:i + rows]
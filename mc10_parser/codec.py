@@ -0,0 +1,306 @@
+""" Lossless binary storage of MC10 sensor streams """
+
+import json
+import numpy as np
+
+MAGIC = b'MC10STRM'
+VERSION = 2
+# version 1 stored raw timestamps and left out array counts
+VERSIONS = [1, 2]
+FORMAT = 'mc10b'
+EXTENSION = '.mc10b'
+ALIGN = 8
+# largest distance, in counts, of a value from its quantization level
+TOLERANCE = 1e-6
+# gaps between values smaller than this, relative to the largest value, are
+# taken to be rounding noise rather than quantization steps
+RESOLUTION = 1e-9
+OFFSETS = [0.0, 0.5]
+INT_TYPES = [np.int8, np.int16, np.int32]
+# bytes stored per timestamp delta kept as an exception to the jitter dtype
+EXCEPTION_BYTES = 16
+
+
+def smallest_int(lo, hi, types=INT_TYPES):
+    """ Returns the smallest signed int dtype holding lo to hi, or None. """
+    for t in types:
+        info = np.iinfo(t)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(t)
+    return None
+
+
+def _array(buf, spec, rows):
+    """ Returns the array described by a header spec as a view of buf.
+
+    Specs without a count, written by version 1, hold one value per row.
+    """
+    return np.frombuffer(
+        buf,
+        dtype=np.dtype(spec['dtype']),
+        count=spec.get('count', rows),
+        offset=spec['offset']
+    )
+
+
+def quantize(x):
+    """ Finds the quantization of a float column, if it has one.
+
+    The column is taken to hold ADC counts written as floats,
+    x ~= (counts + offset) * scale with integer counts and an offset of 0
+    or half a step. The step is the smallest gap between distinct values,
+    refined to the median value per count. Floats written through a chain
+    of arithmetic rarely land exactly on counts * scale, so the difference
+    in units in the last place is kept as an integer correction, making
+    decode() bit exact.
+
+    Parameters:
+        x (np.ndarray): float32 or float64 column.
+
+    Returns:
+        tuple or None: (scale, offset, counts, correction), with correction
+            None when every value decodes exactly, or None if x is not
+            quantized.
+    """
+    if x.dtype.kind != 'f' or len(x) == 0 or not np.isfinite(x).all():
+        return None
+    exact = x.astype(np.float64)
+    levels = np.unique(exact)
+    if len(levels) < 2:
+        return None
+    gaps = np.diff(levels)
+    gaps = gaps[gaps > RESOLUTION * np.abs(levels).max()]
+    if len(gaps) == 0:
+        return None
+    step = gaps.min()
+
+    for offset in OFFSETS:
+        q = exact / step - offset
+        counts = np.round(q)
+        if np.abs(q - counts).max() < TOLERANCE:
+            break
+    else:
+        return None
+
+    level = counts + offset
+    nonzero = level != 0
+    scale = float(np.median(exact[nonzero] / level[nonzero]))
+    q = exact / scale - offset
+    counts = np.round(q)
+    if np.abs(q - counts).max() >= TOLERANCE:
+        return None
+    count_type = smallest_int(counts.min(), counts.max(), INT_TYPES[1:])
+    if count_type is None:
+        return None
+    counts = counts.astype(count_type)
+
+    bits = np.dtype(f'i{x.dtype.itemsize}')
+    correction = x.view(bits) - \
+        decode(scale, offset, counts, dtype=x.dtype).view(bits)
+    if not correction.any():
+        return scale, offset, counts, None
+    correction_type = smallest_int(correction.min(), correction.max())
+    if correction_type is None:
+        return None
+    return scale, offset, counts, correction.astype(correction_type)
+
+
+def decode(
+    scale, offset, counts, correction=None, dtype=np.float64, out=None
+):
+    """ Returns the float values of quantized counts.
+
+    Parameters:
+        scale (float): Value step per count.
+        offset (float): Offset of the counts, in steps.
+        counts (np.ndarray): Integer counts.
+
+    Keyword Arguments:
+        correction (np.ndarray): Per-value correction in units in the last
+            place, from quantize.
+        dtype (np.dtype): float32 or float64 output dtype.
+        out (np.ndarray): Array to write the values into.
+    """
+    values = ((counts.astype(np.float64) + offset) * scale).astype(
+        dtype, copy=False
+    )
+    if correction is not None:
+        bits = np.dtype(f'i{values.dtype.itemsize}')
+        values = (values.view(bits) + correction).view(values.dtype)
+    if out is None:
+        return values
+    out[:] = values
+    return out
+
+
+def encode_column(x):
+    """ Returns the header entry and arrays encoding one value column.
+
+    Quantized columns are stored as 'counts'; any other column, such as
+    one holding NaNs, is stored 'raw' as is.
+    """
+    q = quantize(x)
+    if q is None:
+        return {'encoding': 'raw'}, [('values', x)]
+    scale, offset, counts, correction = q
+    arrays = [('counts', counts)]
+    if correction is not None:
+        arrays.append(('correction', correction))
+    entry = {
+        'encoding': 'counts',
+        'scale': scale,
+        'offset': offset,
+        'dtype': x.dtype.str
+    }
+    return entry, arrays
+
+
+def encode_ts(ts):
+    """ Returns the header entry and arrays encoding the timestamps.
+
+    Near-uniformly sampled timestamps are stored as the start time, the
+    nominal (median) sample period and each delta's signed jitter about
+    it, in whichever int dtype takes the fewest bytes. Deltas outside that
+    dtype, such as dropouts and gaps, are kept as (position, delta)
+    exceptions.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    if len(ts) < 2:
+        return {'encoding': 'raw'}, [('values', ts)]
+    deltas = np.diff(ts)
+    period = int(np.median(deltas))
+    jitter = deltas - period
+
+    best = None
+    for t in INT_TYPES:
+        info = np.iinfo(t)
+        outside = (jitter < info.min) | (jitter > info.max)
+        size = len(jitter) * info.bits // 8 + \
+            EXCEPTION_BYTES * np.count_nonzero(outside)
+        if best is None or size < best[0]:
+            best = size, t, outside
+    _, t, outside = best
+
+    arrays = [('jitter', np.where(outside, 0, jitter).astype(t))]
+    positions = np.flatnonzero(outside)
+    if len(positions):
+        arrays.append(('positions', positions.astype(np.int64)))
+        arrays.append(('deltas', deltas[positions]))
+    entry = {'encoding': 'delta', 'start': int(ts[0]), 'period': period}
+    return entry, arrays
+
+
+def decode_ts(entry, buf, rows):
+    """ Returns int64 timestamps from their header entry, in one cumsum. """
+    if entry['encoding'] == 'raw':
+        return _array(buf, entry['values'], rows).copy()
+    ts = np.empty(rows, dtype=np.int64)
+    ts[0] = entry['start']
+    ts[1:] = _array(buf, entry['jitter'], rows)
+    ts[1:] += entry['period']
+    if 'positions' in entry:
+        ts[1 + _array(buf, entry['positions'], rows)] = \
+            _array(buf, entry['deltas'], rows)
+    return np.cumsum(ts, out=ts)
+
+
+def write(f, ts, columns, names, index_name):
+    """ Writes a stream in the binary format.
+
+    The file is MAGIC, the uint64 header size and a JSON header locating
+    every array, then the arrays themselves, each aligned to 8 bytes.
+    Timestamps are delta encoded (encode_ts) and value columns stored as
+    quantized counts where possible (encode_column).
+    Arguments match csvwriter.write_csv.
+
+    Parameters:
+        f (file): Binary file object to write to.
+        ts (np.ndarray): int64 UTC microsecond timestamps.
+        columns (list of np.ndarray): Value columns.
+        names (list of strings): Value column names.
+        index_name (string): Timestamp column name.
+    """
+    encoded = [encode_ts(ts)]
+    encoded += [encode_column(np.asarray(c)) for c in columns]
+
+    offset = 0
+    for entry, arrays in encoded:
+        for key, a in arrays:
+            entry[key] = {
+                'offset': offset,
+                'dtype': a.dtype.str,
+                'count': len(a)
+            }
+            offset += a.nbytes + -a.nbytes % ALIGN
+
+    header = {
+        'version': VERSION,
+        'rows': len(ts),
+        'index_name': index_name,
+        'ts': encoded[0][0],
+        'columns': [
+            dict(entry, name=name)
+            for name, (entry, _) in zip(names, encoded[1:])
+        ],
+        'dtype': np.result_type(*columns).str if columns else '<f8',
+    }
+    raw = json.dumps(header).encode()
+    raw = raw.ljust(len(raw) + -len(raw) % ALIGN)
+    f.write(MAGIC + np.uint64(len(raw)).tobytes() + raw)
+    for _, arrays in encoded:
+        for _, a in arrays:
+            f.write(memoryview(np.ascontiguousarray(a)).cast('B'))
+            f.write(bytes(-a.nbytes % ALIGN))
+
+
+def is_encoded(f):
+    """ Returns whether f holds a binary stream, without moving it. """
+    if f.seekable():
+        pos = f.tell()
+        magic = f.read(len(MAGIC))
+        f.seek(pos)
+    else:
+        magic = f.peek(len(MAGIC))[:len(MAGIC)]
+    return magic == MAGIC
+
+
+def read(f):
+    """ Reads a binary stream written by write.
+
+    Returns:
+        np.ndarray: int64 UTC microsecond timestamps.
+        np.ndarray: (rows, columns) sensor value matrix.
+        list of strings: Value column names.
+        string: Timestamp column name.
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not an MC10 binary stream.")
+    size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+    header = json.loads(f.read(size))
+    if header['version'] not in VERSIONS:
+        raise ValueError(f"Unsupported stream version {header['version']}.")
+    buf = f.read()
+    rows = header['rows']
+
+    ts = decode_ts(header['ts'], buf, rows)
+    # column-major values give pandas a single block without a copy
+    values = np.empty(
+        (rows, len(header['columns'])), dtype=header['dtype'], order='F'
+    )
+    for i, c in enumerate(header['columns']):
+        if c['encoding'] == 'raw':
+            values[:, i] = _array(buf, c['values'], rows)
+        else:
+            correction = None
+            if 'correction' in c:
+                correction = _array(buf, c['correction'], rows)
+            decode(
+                c['scale'],
+                c['offset'],
+                _array(buf, c['counts'], rows),
+                correction,
+                dtype=c['dtype'],
+                out=values[:, i]
+            )
+    return ts, values, [c['name'] for c in header['columns']], \
+        header['index_name']
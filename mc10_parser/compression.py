@@ -0,0 +1,403 @@
+""" Block-parallel compression of MC10 stream files """
+
+import bz2
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import io
+import lzma
+import os
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# uncompressed bytes per independently compressed member
+BLOCK_SIZE = 1 << 20
+# gzip extra subfield holding the compressed size of its member
+SUBFIELD = b'MC'
+GZIP_HEADER = 20
+
+Codec = namedtuple(
+    'Codec', ['extension', 'magic', 'module', 'compress', 'decompressor']
+)
+
+
+def gzip_member(block, level=None):
+    """ Compresses block as one gzip member that records its own size.
+
+    The size is kept in an extra field, which gzip tools skip, so members
+    of a file can be found and decompressed in parallel.
+    """
+    c = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION if level is None else level,
+        zlib.DEFLATED,
+        -zlib.MAX_WBITS
+    )
+    body = c.compress(block) + c.flush()
+    size = GZIP_HEADER + len(body) + 8
+    return b''.join([
+        b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff',
+        struct.pack('<H2sHI', 8, SUBFIELD, 4, size),
+        body,
+        struct.pack('<II', zlib.crc32(block), len(block) & 0xffffffff)
+    ])
+
+
+def gzip_member_size(header):
+    """ Returns the member size recorded by gzip_member, or None. """
+    if len(header) < GZIP_HEADER or header[3] != 4:
+        return None
+    xlen, subfield, length, size = struct.unpack('<H2sHI', header[10:20])
+    if xlen != 8 or subfield != SUBFIELD or length != 4:
+        return None
+    return size
+
+
+CODECS = {
+    'gzip': Codec(
+        '.gz',
+        b'\x1f\x8b',
+        zlib,
+        gzip_member,
+        lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+    ),
+    'bz2': Codec(
+        '.bz2',
+        b'BZh',
+        bz2,
+        lambda block, level=None: bz2.compress(block, level or 9),
+        bz2.BZ2Decompressor
+    ),
+    'xz': Codec(
+        '.xz',
+        b'\xfd7zXZ\x00',
+        lzma,
+        lambda block, level=None: lzma.compress(block, preset=level),
+        lzma.LZMADecompressor
+    ),
+    'zstd': Codec(
+        '.zst',
+        b'\x28\xb5\x2f\xfd',
+        zstandard,
+        lambda block, level=None: zstandard.ZstdCompressor(
+            level=3 if level is None else level
+        ).compress(block),
+        lambda: zstandard.ZstdDecompressor().decompressobj()
+    ),
+    'lz4': Codec(
+        '.lz4',
+        b'\x04\x22\x4d\x18',
+        lz4_frame,
+        lambda block, level=None: lz4_frame.compress(
+            block, compression_level=level or 0
+        ),
+        lambda: lz4_frame.LZ4FrameDecompressor()
+    ),
+}
+
+
+def get_codec(compression):
+    """ Returns the Codec called compression, checking it is installed. """
+    if compression not in CODECS:
+        raise ValueError(f"Unknown compression {compression}.")
+    codec = CODECS[compression]
+    if codec.module is None:
+        raise ImportError(f"{compression} compression is not installed.")
+    return codec
+
+
+def extension(compression):
+    """ Returns the file extension of compression, '' for None. """
+    return '' if compression is None else CODECS[compression].extension
+
+
+def detect(f, name=None):
+    """ Returns the name of the codec compressing f, or None.
+
+    The codec is taken from the extension of name when it has a known one,
+    otherwise from the magic bytes at the start of f, read without moving
+    its position.
+    """
+    if isinstance(name, str):
+        for compression, codec in CODECS.items():
+            if name.endswith(codec.extension):
+                return compression
+    if isinstance(f, io.TextIOBase):
+        # text buffers, such as StringIO CSV data, are never compressed
+        return None
+    n = max(len(c.magic) for c in CODECS.values())
+    if f.seekable():
+        pos = f.tell()
+        head = f.read(n)
+        f.seek(pos)
+    elif hasattr(f, 'peek'):
+        head = f.peek(n)[:n]
+    else:
+        return None
+    for compression, codec in CODECS.items():
+        if head.startswith(codec.magic):
+            return compression
+    return None
+
+
+def workers_or_cpus(workers):
+    """ Returns workers, defaulting to the number of CPUs. """
+    return workers or os.cpu_count() or 1
+
+
+class CompressedWriter(io.RawIOBase):
+    """ Write-only file that compresses blocks in parallel.
+
+    Writes are cut into blocks of block_size bytes, each compressed as an
+    independent member on a thread pool (zlib, bz2 and lzma release the
+    GIL) and written to f in order, so the output is a valid concatenated
+    stream of the codec. At most twice the pool's workers blocks are in
+    flight at once.
+    """
+
+    def __init__(
+        self, f, compression, level=None, executor=None, workers=None,
+        block_size=BLOCK_SIZE
+    ):
+        """ Initialize CompressedWriter.
+
+        Parameters:
+            f (file): Binary file object to write compressed bytes to.
+            compression (string): Codec name, a key of CODECS.
+
+        Keyword Arguments:
+            level (int): Codec compression level, None for its default.
+            executor (concurrent.futures.Executor): Thread pool to compress
+                on, shared between writers; one is created if None.
+            workers (int): Threads of the pool created when executor is
+                None, defaulting to the number of CPUs.
+            block_size (int): Uncompressed bytes per member.
+        """
+        super().__init__()
+        self.f = f
+        self.codec = get_codec(compression)
+        self.level = level
+        workers = workers_or_cpus(workers)
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=workers)
+        self.lookahead = 2 * workers
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.pending = deque()
+        self.members = 0
+
+    def writable(self):
+        return True
+
+    def _submit(self, block):
+        """ Queues block for compression, writing finished members. """
+        self.pending.append(
+            self.executor.submit(self.codec.compress, block, self.level)
+        )
+        self.members += 1
+        while len(self.pending) > self.lookahead:
+            self.f.write(self.pending.popleft().result())
+
+    def write(self, b):
+        if self.closed:
+            raise ValueError("write to closed CompressedWriter")
+        self.buffer += b
+        while len(self.buffer) >= self.block_size:
+            self._submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(b)
+
+    def close(self):
+        """ Compresses buffered bytes and writes every pending member. """
+        if self.closed:
+            return
+        try:
+            if self.buffer or not self.members:
+                self._submit(bytes(self.buffer))
+            while self.pending:
+                self.f.write(self.pending.popleft().result())
+        finally:
+            if self.own_executor:
+                self.executor.shutdown()
+            super().close()
+
+    def abort(self):
+        """ Drops pending members without writing them. """
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.buffer.clear()
+        if self.own_executor:
+            self.executor.shutdown()
+        super().close()
+
+
+def iter_members(f):
+    """ Yields the whole gzip_member members of f, None if it has others. """
+    while True:
+        header = f.read(GZIP_HEADER)
+        if not header:
+            return
+        size = gzip_member_size(header)
+        if size is None:
+            yield header, None
+            return
+        yield header + f.read(size - GZIP_HEADER), size
+
+
+def iter_decompressed(f, codec, read_size=BLOCK_SIZE):
+    """ Yields the decompressed bytes of concatenated members of f. """
+    d = codec.decompressor()
+    while True:
+        data = f.read(read_size)
+        if not data:
+            return
+        while data:
+            out = d.decompress(data)
+            if out:
+                yield out
+            if not d.eof:
+                break
+            data = d.unused_data
+            d = codec.decompressor()
+
+
+def iter_blocks(f, compression, executor, workers):
+    """ Yields decompressed blocks of f, working ahead on executor.
+
+    Members written by gzip_member are decompressed in parallel. Other
+    streams are decompressed in order one read ahead of the consumer, so
+    decompression overlaps with parsing.
+    """
+    codec = get_codec(compression)
+    lookahead = 2 * workers
+    pending = deque()
+    if compression == 'gzip':
+        for member, size in iter_members(f):
+            if size is None:
+                # a foreign gzip stream, decompressed from here in order
+                rest = io.BufferedReader(Prepended(member, f))
+                while pending:
+                    yield pending.popleft().result()
+                yield from iter_readahead(rest, codec, executor)
+                return
+            pending.append(executor.submit(
+                zlib.decompress, member, 16 + zlib.MAX_WBITS
+            ))
+            while len(pending) > lookahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+        return
+    yield from iter_readahead(f, codec, executor)
+
+
+def iter_readahead(f, codec, executor):
+    """ Yields iter_decompressed blocks, computing the next in the pool. """
+    blocks = iter_decompressed(f, codec)
+    future = executor.submit(next, blocks, None)
+    while True:
+        block = future.result()
+        if block is None:
+            return
+        future = executor.submit(next, blocks, None)
+        yield block
+
+
+class Prepended(io.RawIOBase):
+    """ Read-only file of some bytes followed by the rest of f. """
+
+    def __init__(self, head, f):
+        super().__init__()
+        self.head = head
+        self.f = f
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.head:
+            n = min(len(b), len(self.head))
+            b[:n] = self.head[:n]
+            self.head = self.head[n:]
+            return n
+        data = self.f.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+class DecompressedReader(io.RawIOBase):
+    """ Read-only file of the decompressed contents of f. """
+
+    def __init__(self, blocks):
+        """ Initialize DecompressedReader from an iterable of blocks. """
+        super().__init__()
+        self.blocks = iter(blocks)
+        self.block = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not len(self.block):
+            block = next(self.blocks, None)
+            if block is None:
+                return 0
+            self.block = memoryview(block)
+        n = min(len(b), len(self.block))
+        b[:n] = self.block[:n]
+        self.block = self.block[n:]
+        return n
+
+    def readall(self):
+        rest = [bytes(self.block)] + list(self.blocks)
+        self.block = memoryview(b'')
+        return b''.join(rest)
+
+
+@contextmanager
+def compressing(f, compression=None, level=None, executor=None, workers=None):
+    """ Yields f wrapped in a CompressedWriter, or f for no compression.
+
+    Pending members are written when the block exits normally and dropped
+    if it raises. See CompressedWriter for the arguments.
+    """
+    if compression is None:
+        yield f
+        return
+    writer = CompressedWriter(
+        f, compression, level=level, executor=executor, workers=workers
+    )
+    try:
+        yield writer
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+
+
+@contextmanager
+def decompressing(f, compression, workers=None):
+    """ Yields a buffered, non-seekable reader of f decompressed.
+
+    Blocks are decompressed on a pool of workers threads, defaulting to the
+    number of CPUs, while the reader is consumed.
+    """
+    workers = workers_or_cpus(workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        blocks = iter_blocks(f, compression, executor, workers)
+        try:
+            yield io.BufferedReader(
+                DecompressedReader(blocks), buffer_size=BLOCK_SIZE
+            )
+        finally:
+            blocks.close()
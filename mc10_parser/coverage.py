@@ -0,0 +1,198 @@
+""" Coverage and gap index of MC10 sensor streams """
+
+import numpy as np
+import pandas as pd
+
+from . import shift
+from .annotations import to_us
+from .times import us_to_index
+
+FILENAME = 'coverage.csv'
+# sample deltas above this many nominal periods are gaps
+GAP_FACTOR = 2
+COLUMNS = [
+    'folder', 'data_folder', 'type', 'start', 'stop', 'rows', 'rate',
+    'max_gap'
+]
+
+
+def stream_runs(ts, period=None, gap_factor=GAP_FACTOR):
+    """ Finds the contiguous runs of a stream in one vectorized pass.
+
+    Parameters:
+        ts (np.ndarray): Sorted int64 UTC microsecond timestamps.
+
+    Keyword Arguments:
+        period (float): Nominal sample period in microseconds, the median
+            sample delta if None.
+        gap_factor (float): Deltas above gap_factor periods end a run.
+
+    Returns:
+        dict: Run 'start' and 'stop' timestamps, 'rows' per run, effective
+            'rate' in Hz per run and the 'max_gap' delta within a run.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    deltas = np.diff(ts)
+    if period is None:
+        period = np.median(deltas) if len(deltas) else 0
+    max_gap = int(gap_factor * period)
+    if not len(ts):
+        first = last = np.empty(0, dtype=np.int64)
+    else:
+        breaks = np.flatnonzero(deltas > max_gap)
+        first = np.r_[0, breaks + 1]
+        last = np.r_[breaks, len(ts) - 1]
+    rows = last - first + 1
+    span = ts[last] - ts[first]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(span > 0, (rows - 1) * 1e6 / span, np.nan)
+    return {
+        'start': ts[first],
+        'stop': ts[last],
+        'rows': rows,
+        'rate': rate,
+        'max_gap': np.full(len(first), max_gap, dtype=np.int64)
+    }
+
+
+class CoverageIndex:
+    """ Contiguous runs of every stream, queried without the data.
+
+    Runs are kept per data folder and type as int64 UTC microseconds.
+    Queries join a folder's runs across its segments wherever the step
+    from one to the next is no longer than their gap threshold.
+    """
+
+    def __init__(self, runs, tz):
+        """ Initialize CoverageIndex.
+
+        Parameters:
+            runs (DataFrame): One row per run with COLUMNS.
+            tz (pytz.timezone): Timezone for naive query times and results.
+        """
+        self.runs = runs[COLUMNS].sort_values(
+            ['folder', 'type', 'start'], kind='stable'
+        ).reset_index(drop=True)
+        self.tz = tz
+
+    @classmethod
+    def fromruns(cls, streams, tz):
+        """ Builds a CoverageIndex from the runs of each stream.
+
+        Parameters:
+            streams (iterable): (folder, data folder, type, stream_runs
+                result) of each stream.
+            tz (pytz.timezone): Timezone for naive query times and results.
+        """
+        frames = []
+        for folder, data_folder, t, runs in streams:
+            runs = pd.DataFrame(runs)
+            runs.insert(0, 'folder', folder)
+            runs.insert(1, 'data_folder', data_folder)
+            runs.insert(2, 'type', t)
+            frames.append(runs)
+        if not frames:
+            return cls(pd.DataFrame(columns=COLUMNS), tz)
+        return cls(pd.concat(frames, ignore_index=True), tz)
+
+    @classmethod
+    def read_csv(cls, f, tz):
+        """ Reads a CoverageIndex written by to_csv. """
+        return cls(pd.read_csv(f, float_precision='round_trip'), tz)
+
+    def to_csv(self, f):
+        """ Writes the runs to a CSV path or buffer. """
+        self.runs.to_csv(f, index=False)
+
+    def __len__(self):
+        return len(self.runs)
+
+    def streams(self):
+        """ Returns the (folder, type) pairs in the index. """
+        return list(
+            self.runs[['folder', 'type']].drop_duplicates().itertuples(
+                index=False, name=None
+            )
+        )
+
+    def joined(self, folder, t):
+        """ Returns the starts and stops of folder's type t joined runs. """
+        runs = self.runs[
+            (self.runs['folder'] == folder) & (self.runs['type'] == t)
+        ]
+        starts = runs['start'].to_numpy(dtype=np.int64)
+        stops = runs['stop'].to_numpy(dtype=np.int64)
+        if not len(starts):
+            return starts, stops
+        max_gap = runs['max_gap'].to_numpy(dtype=np.int64)
+        breaks = np.flatnonzero(
+            starts[1:] - stops[:-1] > np.maximum(max_gap[1:], max_gap[:-1])
+        )
+        return starts[np.r_[0, breaks + 1]], stops[np.r_[breaks, -1]]
+
+    def continuous(self, start, end, folders=None, types=None):
+        """ Returns the streams with continuous coverage from start to end.
+
+        Naive times are taken to be in the index timezone; ints are UTC
+        microseconds.
+
+        Keyword Arguments:
+            folders (list of strings): Folders to consider, all if None.
+            types (list of strings): Data types to consider, all if None.
+
+        Returns:
+            list of tuples: (folder, type) of every stream with one joined
+                run spanning start to end.
+        """
+        start, end = to_us(start, self.tz), to_us(end, self.tz)
+        covered = []
+        for folder, t in self.streams():
+            if (folders and folder not in folders) or \
+                    (types and t not in types):
+                continue
+            starts, stops = self.joined(folder, t)
+            i = np.searchsorted(starts, start, side='right') - 1
+            if i >= 0 and stops[i] >= end:
+                covered.append((folder, t))
+        return covered
+
+    def gaps(self, folder=None, t=None):
+        """ Returns the gaps between joined runs as a DataFrame.
+
+        Keyword Arguments:
+            folder (string): Folder to list, all if None.
+            t (string): Data type to list, all if None.
+
+        Returns:
+            DataFrame: folder, type, and tz-aware start (last sample
+                before) and stop (first sample after) of each gap.
+        """
+        frames = []
+        for f, typ in self.streams():
+            if (folder and f != folder) or (t and typ != t):
+                continue
+            starts, stops = self.joined(f, typ)
+            frames.append(pd.DataFrame({
+                'folder': f,
+                'type': typ,
+                'start': us_to_index(stops[:-1], self.tz),
+                'stop': us_to_index(starts[1:], self.tz)
+            }))
+        if not frames:
+            return pd.DataFrame(columns=['folder', 'type', 'start', 'stop'])
+        return pd.concat(frames, ignore_index=True)
+
+    def shifted(self, target_date):
+        """ Returns the index of the streams date shifted to target_date.
+
+        Each stream moves by the same calendar days as shift.shift_frame
+        moves its data.
+        """
+        runs = self.runs.copy()
+        for _, i in runs.groupby(['data_folder', 'type']).groups.items():
+            starts = runs.loc[i, 'start'].to_numpy(dtype=np.int64)
+            stops = runs.loc[i, 'stop'].to_numpy(dtype=np.int64)
+            days = shift.day_offset(starts.min(), self.tz, target_date)
+            runs.loc[i, 'start'] = shift.shift_us(starts, days, self.tz)
+            runs.loc[i, 'stop'] = shift.shift_us(stops, days, self.tz)
+        return CoverageIndex(runs, self.tz)
@@ -1,19 +1,516 @@
 """ MC10 data load and dump helpers """
 
-from io import StringIO
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor
+)
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from functools import partial
+from io import BytesIO, StringIO
 import numpy as np
+import os
 import pandas as pd
 import pathlib
+import posixpath
 from pytz import timezone, utc
 from s3fs.core import S3FileSystem
+import tempfile
 import timeit
+import zipfile
 
+from . import cache as sidecar
+from . import codec
+from . import compression as compressor
+from .coverage import CoverageIndex, stream_runs
+from .csvwriter import BUFFER_SIZE, frame_columns, write_csv
+from .s3context import S3Context, s3_resource as to_s3_resource
+from .s3upload import MultipartWriter, PART_SIZE
+from . import shift
+from .times import index_to_us, us_to_index
+from .lazy import LazyData
+from .overview import EXTENSION as OVERVIEW, Overview
+from .stream import Stream
 
-def load(spec, s3=None, time=False):
-    """ Loads and returns Session-formatted data from spec metadata. """
+try:
+    import pyarrow
+    from pyarrow import csv as pyarrow_csv
+except ImportError:
+    pyarrow = None
+
+
+TYPES = ['accel', 'elec', 'gyro']
+MASKS = [1, 2, 4]
+# stream file extension of each dump format
+FORMATS = {'csv': '.csv', codec.FORMAT: codec.EXTENSION}
+SPOOL_BYTES = 64 << 20
+
+# a CSV inside a zip archive, decompressed each time it is opened
+ZipMember = namedtuple('ZipMember', ['archive', 'name'])
+
+
+def zip_member(archive, t):
+    """ Returns the ZipMember of archive holding the t CSV. """
+    for name in archive.namelist():
+        if posixpath.basename(name) == f"{t}.csv":
+            return ZipMember(archive, name)
+    raise KeyError(f"No {t}.csv in zip archive.")
+
+
+def spool(chunks, max_bytes=SPOOL_BYTES):
+    """ Copies byte chunks to a buffer, moving it to disk above max_bytes.
+
+    Returns:
+        file: Seekable binary file positioned at its start; a temporary
+            file once more than max_bytes were written, else a BytesIO.
+    """
+    f = BytesIO()
+    for chunk in chunks:
+        if isinstance(f, BytesIO) and f.tell() + len(chunk) > max_bytes:
+            disk = tempfile.TemporaryFile()
+            disk.write(f.getbuffer())
+            f = disk
+        f.write(chunk)
+    f.seek(0)
+    return f
+
+
+def folder_of(spec, data_folder):
+    """ Returns the folder of a data folder, stripping any segment. """
+    if spec.get('segments'):
+        return data_folder.rsplit('_', 1)[0]
+    return data_folder
+
+
+def sampling_period(spec, folder, t):
+    """ Returns the nominal sample period of folder's type t in us.
+
+    The period comes from the spec sampling_rates, None if it has no rate
+    for the stream.
+    """
+    try:
+        i = spec['folders'].index(folder)
+        present = [
+            name for name, mask in zip(TYPES, MASKS)
+            if spec['types'][i] & mask
+        ]
+        return 10**6 / spec['sampling_rates'][i][present.index(t)]
+    except (KeyError, IndexError, ValueError, ZeroDivisionError):
+        return None
+
+
+def stream_locs(spec, s3_prefix=''):
+    """ Returns (folder, data folder, type, location) for each spec stream. """
+    locs = []
+    ext = FORMATS[spec.get('format', 'csv')] + \
+        compressor.extension(spec.get('compression'))
+    for i, folder in enumerate(spec['folders']):
+        for j, t in enumerate(TYPES):
+            if spec['types'][i] & MASKS[j]:
+                if spec.get('segments'):
+                    data_folders = list(map(
+                        lambda x: f"{folder}_{x}",
+                        range(spec['segments'])
+                    ))
+                else:
+                    data_folders = [folder]
+
+                for data_folder in data_folders:
+                    if spec.get('data'):
+                        files = spec['data'][data_folder]
+                        if isinstance(files, zipfile.ZipFile):
+                            data_loc = zip_member(files, t)
+                        else:
+                            data_loc = files[t]
+                    else:
+                        data_loc = \
+                            f"{s3_prefix}{spec['loc']}{data_folder}/{t}{ext}"
+                    locs.append((folder, data_folder, t, data_loc))
+    return locs
+
+
+def s3_filesystem(s3_creds):
+    """ Returns an S3FileSystem for a credentials dict or S3Context. """
+    if isinstance(s3_creds, S3Context):
+        return s3_creds.fs
+    return S3FileSystem(
+        anon=False,
+        key=s3_creds['access_key'],
+        secret=s3_creds['secret_key']
+    )
+
+
+def file_version(data_loc, fs=None):
+    """ Returns a string identifying the current version of data_loc. """
+    if fs is not None:
+        info = fs.info(data_loc)
+        return str(info.get('ETag') or info.get('size'))
+    st = os.stat(data_loc)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+def open_path(path, mode, fs=None):
+    """ Opens a local or S3 (when fs is given) path. """
+    if fs is not None:
+        return fs.open(path, mode)
+    return open(path, mode)
+
+
+@contextmanager
+def open_stream(data_loc, s3_creds=None, compression_workers=None):
+    """ Yields a binary file object for a local, S3 or in-memory stream.
+
+    Zip members are decompressed incrementally as they are read. File
+    objects that cannot seek, such as an open zip member, are read from
+    their current position and so can only be loaded once. Compressed
+    streams, recognized by extension or magic bytes, are decompressed as
+    they are read on compression_workers threads.
+    """
+    with open_raw_stream(data_loc, s3_creds) as f:
+        name = data_loc.name if isinstance(data_loc, ZipMember) else data_loc
+        compression = compressor.detect(f, name)
+        if compression is None:
+            yield f
+        else:
+            with compressor.decompressing(
+                f, compression, workers=compression_workers
+            ) as d:
+                yield d
+
+
+@contextmanager
+def open_raw_stream(data_loc, s3_creds=None):
+    """ Yields the stored bytes of a stream, see open_stream. """
+    if s3_creds:
+        with s3_filesystem(s3_creds).open(data_loc, 'rb') as f:
+            yield f
+    elif isinstance(data_loc, ZipMember):
+        with data_loc.archive.open(data_loc.name) as f:
+            yield f
+    elif hasattr(data_loc, 'read'):
+        if data_loc.seekable():
+            data_loc.seek(0)
+        yield data_loc
+    else:
+        with open(data_loc, 'rb') as f:
+            yield f
+
+
+def read_header(f):
+    """ Returns the CSV column names of f without moving its position. """
+    if f.seekable():
+        pos = f.tell()
+        line = f.readline()
+        f.seek(pos)
+    else:
+        line = f.peek(1 << 16).split(b'\n', 1)[0]
+    if isinstance(line, bytes):
+        line = line.decode()
+    return line.rstrip('\r\n').split(',')
+
+
+def csv_engine(engine='c'):
+    """ Resolves 'auto' to the fastest CSV engine available.
+
+    The engines can differ in the last bit of parsed floats, so 'auto'
+    makes values depend on whether pyarrow is installed.
+    """
+    if engine != 'auto':
+        return engine
+    return 'c' if pyarrow is None else 'pyarrow'
+
+
+def read_mc10_arrays(f, precision='float64', engine='c'):
+    """ Parses an MC10 CSV with its known int64 timestamp/float schema.
+
+    Parameters:
+        f (file): MC10 CSV positioned at its header line.
+
+    Keyword Arguments:
+        precision (string): 'float64' or 'float32' sensor value dtype.
+        engine (string): 'c' for pandas read_csv, 'pyarrow' for the
+            multithreaded Arrow reader, or 'auto' to prefer pyarrow. The
+            two can parse a float 1 ULP apart, so only 'c' gives the same
+            values as the 'pandas' parser.
+
+    Returns:
+        np.ndarray: int64 UTC microsecond timestamps.
+        np.ndarray: (rows, columns) sensor value matrix.
+        list of strings: Value column names.
+        string: Timestamp column name.
+    """
+    columns = read_header(f)
+    if csv_engine(engine) == 'pyarrow':
+        value_type = pyarrow.from_numpy_dtype(np.dtype(precision))
+        table = pyarrow_csv.read_csv(
+            f,
+            convert_options=pyarrow_csv.ConvertOptions(column_types={
+                c: pyarrow.int64() if i == 0 else value_type
+                for i, c in enumerate(columns)
+            })
+        )
+        ts = table.column(0).to_numpy()
+        # column-major values give pandas a single block without a copy
+        values = np.empty(
+            (table.num_rows, len(columns) - 1), dtype=precision, order='F'
+        )
+        for i in range(values.shape[1]):
+            values[:, i] = table.column(i + 1).to_numpy()
+        del table
+    else:
+        dtypes = {c: precision for c in columns[1:]}
+        dtypes[columns[0]] = np.int64
+        df = pd.read_csv(f, dtype=dtypes, index_col=0, engine='c')
+        ts = df.index.values
+        values = df.values
+        del df
+    return ts, values, columns[1:], columns[0]
+
+
+def read_mc10(f, tz, precision='float64', engine='c'):
+    """ Parses an MC10 CSV into a DataFrame with a tz-aware index.
+
+    See read_mc10_arrays for the arguments.
+    """
+    return to_frame(*read_mc10_arrays(f, precision, engine), tz)
+
+
+def to_frame(ts, values, columns, index_name, tz):
+    """ Wraps timestamps and a value matrix in a DataFrame without copying.
+
+    Parameters:
+        ts (np.ndarray): int64 UTC microsecond timestamps.
+        values (np.ndarray): (rows, columns) sensor value matrix.
+        columns (list of strings): Value column names.
+        index_name (string): Timestamp column name.
+        tz (pytz.timezone): Timezone to convert the UTC index to.
+    """
+    return pd.DataFrame(
+        values,
+        index=us_to_index(ts, tz, name=index_name),
+        columns=columns,
+        copy=False
+    )
+
+
+def wrap_stream(ts, values, columns, index_name, tz, container='pandas'):
+    """ Wraps stream arrays in a DataFrame or, for 'array', a Stream. """
+    if container == 'array':
+        return Stream(ts, values, columns, tz, index_name=index_name)
+    if container != 'pandas':
+        raise ValueError(f"Unknown container {container}.")
+    return to_frame(ts, values, columns, index_name, tz)
+
+
+def read_cached_stream(
+    data_loc, tz, cache_dir=None, cache_max_bytes=None, container='pandas',
+    **kwargs
+):
+    """ Reads a local MC10 CSV through its binary sidecar cache.
+
+    On a hit the cached timestamps and values are memory-mapped; on a miss,
+    including a cache holding values of another dtype than the parser
+    options give, the CSV is parsed with read_stream and the cache is
+    (re)written.
+
+    Parameters:
+        data_loc (string): Path to the CSV.
+        tz (pytz.timezone): Timezone to convert the UTC index to.
+
+    Keyword Arguments:
+        cache_dir (string): Directory for caches instead of next to the CSV.
+        cache_max_bytes (int): Size cap for cache_dir, enforced by evicting
+            the least recently used caches.
+        container (string): 'pandas' for a DataFrame, 'array' for a Stream.
+        **kwargs: Parser options passed to read_stream.
+    """
+    path = sidecar.cache_path(data_loc, cache_dir)
+    # values of another precision count as a miss, so the cache is rewritten
+    dtype = kwargs.get('precision', 'float64') \
+        if kwargs.get('parser') == 'mc10' else 'float64'
+    hit = sidecar.read(path, data_loc, dtype=dtype)
+    if hit:
+        return wrap_stream(*hit, tz, container)
+
+    source = sidecar.source_key(data_loc)
+    stream = read_stream(data_loc, tz, container='array', **kwargs)
+    sidecar.write(
+        path,
+        source,
+        stream.ts,
+        stream.values,
+        stream.columns,
+        stream.index_name
+    )
+    if cache_dir and cache_max_bytes:
+        sidecar.evict(cache_dir, cache_max_bytes)
+    if container == 'array':
+        return stream
+    return wrap_stream(
+        stream.ts, stream.values, stream.columns, stream.index_name, tz,
+        container
+    )
+
+
+def read_stream(
+    data_loc, tz, s3_creds=None, parser='pandas', precision='float64',
+    engine='c', container='pandas', compression_workers=None
+):
+    """ Reads one MC10 sensor CSV into a DataFrame with a tz-aware index.
+
+    Streams dumped in the binary codec format are recognized by their
+    leading magic bytes and decoded instead of parsed.
+
+    Parameters:
+        data_loc (string or file): Path, S3 key or buffer holding the CSV.
+        tz (pytz.timezone): Timezone to convert the UTC index to.
+
+    Keyword Arguments:
+        s3_creds (dict): S3 credentials, set when data_loc is an S3 key.
+        parser (string): 'pandas' infers dtypes, 'mc10' uses the fixed
+            MC10 schema with a single pass over the timestamp column.
+        precision (string): Sensor value dtype for the 'mc10' parser.
+        engine (string): read_csv engine for the 'mc10' parser.
+        container (string): 'pandas' for a DataFrame, 'array' for a
+            compact Stream of the raw arrays.
+        compression_workers (int): Threads decompressing a compressed
+            stream, defaulting to the number of CPUs.
+    """
+    with open_stream(data_loc, s3_creds, compression_workers) as f:
+        if codec.is_encoded(f):
+            ts, values, columns, index_name = codec.read(f)
+            if parser == 'mc10' and values.dtype != precision:
+                values = values.astype(precision, order='F')
+            return wrap_stream(ts, values, columns, index_name, tz, container)
+        if parser == 'mc10':
+            return wrap_stream(
+                *read_mc10_arrays(f, precision=precision, engine=engine),
+                tz,
+                container
+            )
+        if parser != 'pandas':
+            raise ValueError(f"Unknown parser {parser}.")
+        df = pd.read_csv(f)
+    df.set_index(df.columns[0], inplace=True)
+    df.index = pd.to_datetime(df.index, unit='us')
+    df.index = df.index.tz_localize(utc).tz_convert(tz)
+    if container == 'array':
+        return Stream.fromframe(df)
+    return df
+
+
+def _timed(fn, *args, **kwargs):
+    """ Calls fn, returning its result and elapsed wall time. """
+    st = timeit.default_timer()
+    return fn(*args, **kwargs), timeit.default_timer() - st
+
+
+def get_executor(workers=None, executor='thread'):
+    """ Returns (executor, owned) for the workers/executor options.
+
+    Parameters:
+        workers (int): Number of pool workers. None, 0 or 1 runs serially.
+        executor (string or concurrent.futures.Executor): 'thread',
+            'process' or an existing executor to submit to.
+
+    Returns:
+        Executor or None: Pool to submit work to, None to run serially.
+        bool: True if the caller created the pool and must shut it down.
+    """
+    if isinstance(executor, Executor):
+        return executor, False
+    if not workers or workers <= 1:
+        return None, False
+    if executor == 'thread':
+        return ThreadPoolExecutor(max_workers=workers), True
+    if executor == 'process':
+        return ProcessPoolExecutor(max_workers=workers), True
+    raise ValueError(f"Unknown executor {executor}.")
+
+
+def map_ordered(fn, args, workers=None, executor='thread'):
+    """ Applies fn to each tuple in args, returning results in order. """
+    pool, owned = get_executor(workers, executor)
+    if pool is None:
+        return [fn(*a) for a in args]
+    try:
+        futures = [pool.submit(fn, *a) for a in args]
+        return [f.result() for f in futures]
+    finally:
+        if owned:
+            pool.shutdown()
+
+
+def imap_bounded(fn, jobs, workers=None, executor='thread'):
+    """ Applies fn to a stream of (key, args) jobs, yielding in order.
+
+    At most twice the number of workers jobs are in flight at a time, so a
+    lazily produced job stream is never materialized all at once.
+
+    Yields:
+        tuple: (key, fn(*args)) for each job.
+    """
+    pool, owned = get_executor(workers, executor)
+    if pool is None:
+        for key, args in jobs:
+            yield key, fn(*args)
+        return
+    limit = 2 * (workers or getattr(pool, '_max_workers', 1))
+    pending = deque()
+    try:
+        for key, args in jobs:
+            pending.append((key, pool.submit(fn, *args)))
+            if len(pending) >= limit:
+                key, future = pending.popleft()
+                yield key, future.result()
+        while pending:
+            key, future = pending.popleft()
+            yield key, future.result()
+    finally:
+        if owned:
+            pool.shutdown()
+
+
+def load(
+    spec, s3=None, time=False, workers=None, executor='thread',
+    parser='pandas', precision='float64', engine='c', cache=False,
+    cache_dir=None, cache_max_bytes=None, lazy=False, container='pandas',
+    compression_workers=None
+):
+    """ Loads and returns Session-formatted data from spec metadata.
+
+    Parameters:
+        spec (dict): Session metadata, with data buffers under 'data' when
+            loading from memory. spec['data'][folder] maps types to
+            buffers or file objects, or is a zipfile.ZipFile holding
+            <type>.csv members.
+
+    Keyword Arguments:
+        s3 (dict): S3 'creds' and 'bucket_name' to load from.
+        time (bool): set True to print per-file and total elapsed time.
+        workers (int): Number of files to parse concurrently.
+        executor (string or concurrent.futures.Executor): 'thread',
+            'process' or an existing executor used to parse files.
+        parser (string): 'pandas' or 'mc10' fast typed CSV parser.
+        precision (string): 'float64' or 'float32' values ('mc10' only).
+        engine (string): read_csv engine for 'mc10', 'c', or 'pyarrow'
+            (or 'auto' to prefer it when installed) for speed at the cost
+            of floats that may differ from 'c' in the last bit.
+        cache (bool): set True to read local CSVs through binary sidecar
+            caches, writing them on first load.
+        cache_dir (string): Directory to keep caches in instead of next to
+            each CSV.
+        cache_max_bytes (int): LRU size cap for cache_dir.
+        lazy (bool): set True to return a LazyData mapping that reads each
+            stream on first access instead of loading everything now.
+        container (string): 'pandas' to hold each stream as a DataFrame,
+            'array' as a compact Stream of its raw arrays.
+        compression_workers (int): Threads decompressing each compressed
+            stream. Compression is detected from the file extension or
+            magic bytes.
+    """
     data = {}
-    types = ['accel', 'elec', 'gyro']
-    masks = [1, 2, 4]
     # can use any of these timezones
     # https://en.wikipedia.org/wiki/List_of_tz_database_time_zones
     tz = timezone(spec['timezone'])
@@ -22,137 +519,296 @@ def load(spec, s3=None, time=False):
         t0 = timeit.default_timer()
 
     anns = None
+    s3_creds = None
+    s3_prefix = ''
 
     if s3:
-        fs = S3FileSystem(
-            anon=False,
-            key=s3['creds']['access_key'],
-            secret=s3['creds']['secret_key']
-        )
+        s3_creds = s3['creds']
         s3_prefix = f"s3://{s3['bucket_name']}/"
 
     if spec.get('meta'):
         if s3:
-            meta_loc = s3_prefix + spec['loc'] + spec['meta']
+            with s3_filesystem(s3_creds).open(
+                s3_prefix + spec['loc'] + spec['meta'], 'rb'
+            ) as f:
+                anns = pd.read_csv(f)
         elif spec.get('data'):
-            meta_loc = StringIO(spec['meta'])
+            anns = pd.read_csv(StringIO(spec['meta']))
         else:
-            meta_loc = spec['loc'] + spec['meta'],
-        anns = pd.read_csv(
-            meta_loc
-        )
+            anns = pd.read_csv(spec['loc'] + spec['meta'])
         anns.set_index(
             anns.columns[0], inplace=True
         )
 
-    for i, folder in enumerate(spec['folders']):
-        for j, t in enumerate(types):
-            if spec['types'][i] & masks[j]:
-                if time:
-                    st = timeit.default_timer()
-                if spec.get('segments'):
-                    data_folders = list(map(
-                        lambda x: f"{folder}_{x}",
-                        range(spec['segments'])
-                    ))
-                    if spec.get('data'):
-                        file_paths = \
-                            [spec['data'][key][t] for key in data_folders]
-                    else:
-                        file_paths = list(map(
-                            lambda d: f"{spec['loc']}{d}/{t}.csv",
-                            data_folders,
-                        ))
-                else:
-                    data_folders = [folder]
-                    if spec.get('data'):
-                        file_paths = [spec['data'][folder][t]]
-                    else:
-                        file_paths = [f"{spec['loc']}{folder}/{t}.csv"]
+    reader = partial(
+        read_stream, tz=tz, s3_creds=s3_creds, parser=parser,
+        precision=precision, engine=engine, container=container,
+        compression_workers=compression_workers
+    )
+    if cache and not s3 and not spec.get('data') \
+            and spec.get('format', 'csv') == 'csv':
+        reader = partial(
+            read_cached_stream, tz=tz, cache_dir=cache_dir,
+            cache_max_bytes=cache_max_bytes, parser=parser,
+            precision=precision, engine=engine, container=container,
+            compression_workers=compression_workers
+        )
+    locs = stream_locs(spec, s3_prefix)
+    if lazy:
+        return LazyData(locs, reader, time=time), anns
+
+    results = map_ordered(
+        _timed,
+        [(reader, loc[3]) for loc in locs],
+        workers=workers,
+        executor=executor
+    )
+
+    for (folder, data_folder, t, _), (df, elapsed) in zip(locs, results):
+        if not data.get(data_folder):
+            data[data_folder] = {}
+        data[data_folder][t] = df
+        if time:
+            print(f"Loaded {data_folder} {t} in {elapsed} s")
 
-                for file_path, data_folder in zip(file_paths, data_folders):
-                    if not data.get(data_folder):
-                        data[data_folder] = {}
-                    if s3:
-                        data_loc = s3_prefix + file_path
-                    else:
-                        data_loc = file_path
-                    data[data_folder][t] = pd.read_csv(data_loc)
-                    data[data_folder][t].set_index(
-                        data[data_folder][t].columns[0], inplace=True
-                    )
-                    data[data_folder][t].index = pd.to_datetime(
-                        data[data_folder][t].index, unit='us'
-                    )
-                    data[data_folder][t].index = data[data_folder][t]. \
-                        index.tz_localize(utc).tz_convert(tz)
-
-                if time:
-                    print(
-                        f"Loaded {folder} {t} in "
-                        f"{timeit.default_timer() - st} s"
-                    )
     if time:
         print(f"Data loaded in {timeit.default_timer() - t0} s")
 
     return data, anns
 
 
-def load_local(spec, time=False):
+def load_local(spec, time=False, **kwargs):
     """ Load Session from local filesystem. """
-    return load(spec, time=time)
+    return load(spec, time=time, **kwargs)
 
 
-def load_mem(spec, time=False):
-    """ Load Session from local filesystem. """
-    return load(spec, time=time)
+def load_mem(spec, time=False, **kwargs):
+    """ Load Session from data in memory. """
+    return load(spec, time=time, **kwargs)
 
 
-def load_s3(s3_creds, s3_bucket_name, spec, time=False):
-    """ Load Session from S3. """
+def load_s3(s3_creds, s3_bucket_name, spec, time=False, **kwargs):
+    """ Load Session from S3 with a credentials dict or S3Context. """
     return load(spec, time=time, s3={
         'creds': s3_creds,
         'bucket_name': s3_bucket_name
-    })
+    }, **kwargs)
 
 
-def dump(spec, data, anns, s3=None, time=False):
-    """ Dumps data to filesystem or S3 as specified by spec metadata. """
-    if time:
-        t0 = timeit.default_timer()
+def iter_frames(data):
+    """ Yields (folder, type, DataFrame) for every stream in data.
 
-    for i, k1 in enumerate(data.keys()):
+    Streams of a LazyData mapping that are not loaded yet are read without
+    being kept in memory.
+    """
+    for k1 in data.keys():
         for k2 in data[k1].keys():
-            if time:
-                st = timeit.default_timer()
-
-            df = data[k1][k2]
-            file_loc = f"{spec['loc']}{k1}/"
-            file_name = f'{k2}.csv'
-            old_index = df.index
-            df.set_index(df.index.astype(np.int64)//1000, inplace=True)
-
-            if s3:
-                csv_buffer = StringIO()
-                df.to_csv(csv_buffer)
-                s3['resource'].Object(
-                    s3['bucket_name'],
-                    file_loc + file_name
-                ).put(
-                    ACL='bucket-owner-full-control',
-                    Body=csv_buffer.getvalue()
-                )
+            if isinstance(data, LazyData):
+                yield k1, k2, data.peek(k1, k2)
             else:
-                pathlib.Path(file_loc).mkdir(parents=True, exist_ok=True)
-                df.to_csv(file_loc + file_name)
+                yield k1, k2, data[k1][k2]
+
+
+def dump_stream(
+    df, file_loc, file_name, s3=None, shift_date=None, part_size=PART_SIZE,
+    format='csv', compression=None, compression_level=None,
+    compression_executor=None, compression_workers=None, period=None,
+    overview_name=None, **kwargs
+):
+    """ Writes one stream as an MC10 CSV, leaving df untouched.
+
+    Returns the coverage.stream_runs of the written timestamps.
+
+    Parameters:
+        df (DataFrame or Stream): Stream with a tz-aware index.
+        file_loc (string): Output folder path or S3 key prefix.
+        file_name (string): Output file name.
 
-            df.set_index(old_index, inplace=True)
+    Keyword Arguments:
+        s3 (dict): S3 'resource' and 'bucket_name' to write to.
+        shift_date (datetime.date): Date to shift the stream start to.
+        part_size (int): Multipart upload part size for S3.
+        format (string): 'csv', or 'mc10b' to write the lossless binary
+            codec format.
+        compression (string): Codec to compress the file with, a key of
+            compression.CODECS, or None.
+        compression_level (int): Codec compression level.
+        compression_executor (concurrent.futures.Executor): Thread pool
+            compressing blocks, shared between files.
+        compression_workers (int): Threads of the pool created when no
+            compression_executor is given.
+        period (float): Nominal sample period for the returned runs.
+        overview_name (string): File name to save the overview.Overview of
+            the written stream under, next to it, or None.
+        **kwargs: Options passed to csvwriter.write_csv.
+    """
+    if isinstance(df, Stream):
+        ts, tz = df.ts, df.tz
+        columns = [df.values[:, i] for i in range(df.values.shape[1])]
+        index_name = df.index_name
+    else:
+        ts, tz = index_to_us(df.index), df.index.tz
+        columns = frame_columns(df)
+        index_name = df.index.name
+    if shift_date is not None and len(ts):
+        ts = shift.shift_us(ts, shift.day_offset(ts[0], tz, shift_date), tz)
+    args = (ts, columns, df.columns, index_name)
+    if format == codec.FORMAT:
+        write = codec.write
+        kwargs = {}
+    elif format == 'csv':
+        write = write_csv
+    else:
+        raise ValueError(f"Unknown format {format}.")
 
+    compressing = partial(
+        compressor.compressing,
+        compression=compression,
+        level=compression_level,
+        executor=compression_executor,
+        workers=compression_workers
+    )
+
+    if s3:
+        with MultipartWriter(
+            s3['resource'].meta.client,
+            s3['bucket_name'],
+            file_loc + file_name,
+            part_size=part_size
+        ) as raw, compressing(raw) as f:
+            write(f, *args, **kwargs)
+    else:
+        pathlib.Path(file_loc).mkdir(parents=True, exist_ok=True)
+        with open(file_loc + file_name, 'wb', buffering=BUFFER_SIZE) as raw, \
+                compressing(raw) as f:
+            write(f, *args, **kwargs)
+
+    if overview_name is not None:
+        overview = Overview.fromcolumns(
+            ts, columns, df.columns, tz, index_name=index_name
+        )
+        if s3:
+            client = s3['resource'].meta.client
+            version = client.head_object(
+                Bucket=s3['bucket_name'], Key=file_loc + file_name
+            )['ETag']
+            s3['resource'].Object(
+                s3['bucket_name'],
+                file_loc + overview_name
+            ).put(
+                ACL='bucket-owner-full-control',
+                Body=overview.tobytes(version)
+            )
+        else:
+            version = file_version(file_loc + file_name)
+            with open(file_loc + overview_name, 'wb') as f:
+                f.write(overview.tobytes(version))
+    return stream_runs(ts, period)
+
+
+def dump(
+    spec, data, anns, s3=None, time=False, shift_date=None, workers=None,
+    executor='thread', float_format=None, precision=None, engine='numpy',
+    part_size=PART_SIZE, format='csv', compression=None,
+    compression_level=None, compression_workers=None, overview=False
+):
+    """ Dumps data to filesystem or S3 as specified by spec metadata.
+
+    Parameters:
+        spec (dict): Session metadata with the output 'loc'.
+        data (dict): Session data to write.
+        anns (DataFrame): Session annotations to write, if any.
+
+    Keyword Arguments:
+        s3 (dict): S3 'resource' and 'bucket_name' to write to.
+        time (bool): set True to print elapsed time.
+        shift_date (datetime.date): Date to shift each stream's start to
+            while writing, leaving the data in memory unchanged.
+        workers (int): Number of files to write (or upload) concurrently.
+        executor (string or concurrent.futures.Executor): 'thread',
+            'process' (local only) or an existing executor.
+        float_format (string): printf-style float format, e.g. '%.6f'.
+        precision (int): Decimal places to round values to.
+        engine (string): CSV writer engine, 'numpy' or 'pyarrow'.
+        part_size (int): Bytes buffered per S3 multipart upload part, which
+            bounds the memory used per file being uploaded.
+        format (string): 'csv', or 'mc10b' to store quantized sensor
+            values losslessly as integer counts and a scale. Loads read
+            the format from spec['format'].
+        compression (string): 'gzip', 'bz2', 'xz', or 'zstd'/'lz4' when
+            installed, to compress every stream file. Blocks of each file
+            are compressed in parallel and written as concatenated members.
+        compression_level (int): Codec compression level.
+        compression_workers (int): Threads compressing blocks, shared by
+            all files, defaulting to the number of CPUs.
+        overview (bool): set True to also save each stream's min/max/mean
+            overview pyramid (<folder>/<type>.overview.npz), computed from
+            the written values while they are in memory.
+
+    When spec names a 'coverage' file, the coverage index of the written
+    (and shifted) streams is saved there as well.
+    """
+    if time:
+        t0 = timeit.default_timer()
+    if s3 and executor == 'process':
+        raise ValueError("S3 dumps cannot use a process executor.")
+
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format}.")
+    ext = FORMATS[format]
+    compression_executor = None
+    if compression is not None:
+        compressor.get_codec(compression)
+        ext += compressor.extension(compression)
+        # process workers compress on pools of their own
+        if executor != 'process':
+            compression_executor = ThreadPoolExecutor(
+                max_workers=compressor.workers_or_cpus(compression_workers)
+            )
+
+    writer = partial(
+        dump_stream, s3=s3, shift_date=shift_date, part_size=part_size,
+        float_format=float_format, precision=precision, engine=engine,
+        format=format, compression=compression,
+        compression_level=compression_level,
+        compression_executor=compression_executor,
+        compression_workers=compression_workers
+    )
+    jobs = (
+        ((k1, k2), (
+            partial(
+                writer,
+                period=sampling_period(spec, folder_of(spec, k1), k2),
+                overview_name=f'{k2}{OVERVIEW}' if overview else None
+            ),
+            df,
+            f"{spec['loc']}{k1}/",
+            f'{k2}{ext}'
+        )) for k1, k2, df in iter_frames(data)
+    )
+    runs = []
+    try:
+        for (k1, k2), (stream, elapsed) in imap_bounded(
+            _timed, jobs, workers=workers, executor=executor
+        ):
+            runs.append((folder_of(spec, k1), k1, k2, stream))
             if time:
-                print(
-                    f"Saved {k1} {k2} in "
-                    f"{timeit.default_timer() - st} s"
-                )
+                print(f"Saved {k1} {k2} in {elapsed} s")
+    finally:
+        if compression_executor is not None:
+            compression_executor.shutdown()
+
+    if spec.get('coverage'):
+        index = CoverageIndex.fromruns(runs, timezone(spec['timezone']))
+        if s3:
+            csv_buffer = StringIO()
+            index.to_csv(csv_buffer)
+            s3['resource'].Object(
+                s3['bucket_name'],
+                spec['loc'] + spec['coverage']
+            ).put(ACL='bucket-owner-full-control', Body=csv_buffer.getvalue())
+        else:
+            index.to_csv(spec['loc'] + spec['coverage'])
 
     if anns is not None:
         if s3:
@@ -169,14 +825,16 @@ def dump(spec, data, anns, s3=None, time=False):
         print(f"Data saved in {timeit.default_timer() - t0} s")
 
 
-def dump_local(spec, data, anns, time=False):
+def dump_local(spec, data, anns, time=False, **kwargs):
     """ Dump Session to local filesystem. """
-    dump(spec, data, anns, time=time)
+    dump(spec, data, anns, time=time, **kwargs)
 
 
-def dump_s3(s3_resource, s3_bucket_name, spec, data, anns, time=False):
-    """ Dump Session to S3. """
+def dump_s3(
+    s3_resource, s3_bucket_name, spec, data, anns, time=False, **kwargs
+):
+    """ Dump Session to S3 with a boto3 resource or S3Context. """
     dump(spec, data, anns, time=time, s3={
-        'resource': s3_resource,
+        'resource': to_s3_resource(s3_resource),
         'bucket_name': s3_bucket_name
-    })
+    }, **kwargs)
@@ -1,7 +1,25 @@
 """ Metadata dict load and dump helpers """
 
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import copy
 import json
 import os
+import posixpath
+import threading
+
+from botocore.exceptions import ClientError
+
+from .s3context import list_etags, s3_resource as to_s3_resource
+
+METADATA = 'metadata.json'
+RESOLVE_WORKERS = 16
+
+# parsed JSON files keyed by (bucket or None, path), with the version read
+_cache = {}
+_cache_lock = threading.Lock()
+# held while a key is read so concurrent readers of one file share a read
+_key_locks = defaultdict(threading.Lock)
 
 """Metadata dict manipulation functions"""
 def dict_to_file(d, fp):
@@ -21,9 +39,9 @@ def data_dict_to_file(d, filepath, template=None, template_path=""):
 
 
 def data_dict_to_s3(s3_resource, bucket_name, d, filename):
-    """Write JSON serializable dict d to filepath on s3_resource """
+    """Write JSON serializable dict d to filepath on s3_resource or S3Context"""
 
-    s3_resource.Object(
+    to_s3_resource(s3_resource).Object(
         bucket_name, d['loc'] + filename
     ).put(ACL='bucket-owner-full-control', Body=json.dumps(d))
 
@@ -35,9 +53,97 @@ def dict_from_file(fp):
         return json.load(f)
 
 
+def clear_cache():
+    """Forget every memoized metadata and template file"""
+
+    with _cache_lock:
+        _cache.clear()
+        _key_locks.clear()
+
+
+def _key_lock(key):
+    """Return the lock serializing reads of key"""
+
+    with _cache_lock:
+        return _key_locks[key]
+
+
+def _cached(key, version):
+    """Return a copy of the dict cached for key at version, or None"""
+
+    with _cache_lock:
+        hit = _cache.get(key)
+    if hit is not None and hit[0] == version:
+        return copy.deepcopy(hit[1])
+    return None
+
+
+def _store(key, version, d):
+    """Cache dict d for key at version and return a copy of it"""
+
+    with _cache_lock:
+        _cache[key] = (version, d)
+    return copy.deepcopy(d)
+
+
+def cached_dict_from_file(fp):
+    """Load JSON serialized dict from filepath fp, memoized on its mtime"""
+
+    st = os.stat(fp)
+    version = (st.st_mtime_ns, st.st_size)
+    key = (None, os.path.abspath(fp))
+    with _key_lock(key):
+        d = _cached(key, version)
+        if d is None:
+            d = _store(key, version, dict_from_file(fp))
+    return d
+
+
+def cached_dict_from_s3(s3_resource, bucket_name, key, etag=None):
+    """Load JSON serialized dict from key on S3, memoized on its ETag
+
+    With a known etag (e.g. from a listing) a cached copy is used without a
+    request; otherwise a cached copy is revalidated with a conditional GET.
+    """
+
+    cache_key = (bucket_name, key)
+    with _key_lock(cache_key):
+        if etag is not None:
+            d = _cached(cache_key, etag)
+            if d is not None:
+                return d
+
+        client = to_s3_resource(s3_resource).meta.client
+        kwargs = {'Bucket': bucket_name, 'Key': key}
+        with _cache_lock:
+            hit = _cache.get(cache_key)
+        if hit is not None:
+            kwargs['IfNoneMatch'] = hit[0]
+        try:
+            response = client.get_object(**kwargs)
+        except ClientError as e:
+            if hit is not None and \
+                    e.response['Error']['Code'] in ['304', 'NotModified']:
+                return copy.deepcopy(hit[1])
+            raise
+        return _store(
+            cache_key, response['ETag'], json.loads(response['Body'].read())
+        )
+
+
+def merge_template(d, template):
+    """Return metadata d with values missing from it taken from template"""
+
+    return dict(list(template.items()) + list(d.items()))
+
+
 def data_dict_from_file(filepath):
-    """Read JSON serialized dict from filepath, loading values from template if applicable"""
-    d = dict_from_file(filepath)
+    """Read JSON serialized dict from filepath, loading values from template if applicable
+
+    Files are memoized on their mtime, so a template shared by many
+    subjects is only read and parsed once.
+    """
+    d = cached_dict_from_file(filepath)
 
     if d.get('template_path'):
         if d['template_path'][0]== '/':
@@ -46,16 +152,69 @@ def data_dict_from_file(filepath):
             tfp = os.path.normpath(
                 os.path.join(os.path.dirname(filepath), d['template_path'])
             )
-        td = dict_from_file(tfp)
-        d = dict(list(td.items()) + list(d.items()))
+        d = merge_template(d, cached_dict_from_file(tfp))
 
     return d
 
 
-def data_dict_from_s3(s3_resource, bucket_name, filename):
-    """Read JSON serializable dict d from filepath on s3_resource """
+def data_dict_from_s3(s3_resource, bucket_name, filename, etags=None):
+    """Read JSON serializable dict d from filepath on s3_resource or S3Context
+
+    Values are loaded from the template if applicable. Files are memoized
+    on their ETag; etags maps keys to ETags already known from a listing.
+    """
+    etags = etags or {}
+    d = cached_dict_from_s3(
+        s3_resource, bucket_name, filename, etags.get(filename)
+    )
+
+    if d.get('template_path'):
+        if d['template_path'][0] == '/':
+            tkey = d['template_path'].lstrip('/')
+        else:
+            tkey = posixpath.normpath(posixpath.join(
+                posixpath.dirname(filename), d['template_path']
+            ))
+        d = merge_template(d, cached_dict_from_s3(
+            s3_resource, bucket_name, tkey, etags.get(tkey)
+        ))
+
+    return d
+
 
-    response = s3_resource.Object(
-        bucket_name, filename
-    ).get()
-    return json.loads(response['Body'].read())
+def resolve_all(path, workers=RESOLVE_WORKERS):
+    """Read every metadata.json under directory path, resolving templates
+
+    Returns a dict of metadata keyed by filepath, in sorted order.
+    """
+    paths = sorted(
+        os.path.join(d, METADATA)
+        for d, _, files in os.walk(path) if METADATA in files
+    )
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(data_dict_from_file, paths)))
+
+
+def resolve_all_s3(
+    s3_resource, bucket_name, prefix, workers=RESOLVE_WORKERS
+):
+    """Read every metadata.json under an S3 prefix, resolving templates
+
+    One paginated listing supplies the ETags of every file, so files that
+    are already memoized are not fetched again and each distinct file is
+    fetched at most once, concurrently.
+
+    Returns a dict of metadata keyed by S3 key, in sorted order.
+    """
+    client = to_s3_resource(s3_resource).meta.client
+    etags = list_etags(client, bucket_name, prefix)
+    keys = sorted(
+        k for k in etags if k == METADATA or k.endswith('/' + METADATA)
+    )
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(keys, pool.map(
+            lambda k: data_dict_from_s3(
+                s3_resource, bucket_name, k, etags=etags
+            ),
+            keys
+        )))
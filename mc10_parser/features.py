@@ -0,0 +1,144 @@
+""" Windowed feature extraction over MC10 sensor streams """
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+import pandas as pd
+
+from .times import index_to_us, us_to_index
+
+FEATURES = ['mean', 'std', 'rms', 'energy', 'zero_crossings', 'magnitude']
+AXIS_FEATURES = ['mean', 'std', 'rms', 'energy', 'zero_crossings']
+
+
+def sliding_windows(values, window, step):
+    """ Returns a read-only (windows, window, columns) view of values.
+
+    Window i covers rows i * step to i * step + window; rows after the last
+    whole window are left out. No data is copied.
+    """
+    values = values.reshape(len(values), -1)
+    n = (len(values) - window) // step + 1 if len(values) >= window else 0
+    row, col = values.strides
+    return as_strided(
+        values,
+        shape=(n, window, values.shape[1]),
+        strides=(row * step, row, col),
+        writeable=False
+    )
+
+
+def window_features(windows, features=FEATURES):
+    """ Computes features over a (windows, window, columns) array.
+
+    Per-axis features are 'mean', 'std', 'rms', 'energy' (sum of squares)
+    and 'zero_crossings' (sign changes of the window minus its mean).
+    'magnitude' is the mean Euclidean norm across all columns.
+
+    Returns:
+        dict: Feature name to (windows, columns) array, or (windows,) for
+            'magnitude'.
+    """
+    unknown = set(features) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown features {sorted(unknown)}.")
+    out = {}
+    mean = windows.mean(axis=1)
+    squares = None
+    if {'rms', 'energy', 'magnitude'} & set(features):
+        squares = np.square(windows)
+    for f in features:
+        if f == 'mean':
+            out[f] = mean
+        elif f == 'std':
+            out[f] = windows.std(axis=1)
+        elif f == 'rms':
+            out[f] = np.sqrt(squares.mean(axis=1))
+        elif f == 'energy':
+            out[f] = squares.sum(axis=1)
+        elif f == 'zero_crossings':
+            signs = np.signbit(windows - mean[:, np.newaxis, :])
+            out[f] = (signs[:, 1:] != signs[:, :-1]).sum(axis=1)
+        elif f == 'magnitude':
+            out[f] = np.sqrt(squares.sum(axis=2)).mean(axis=1)
+    return out
+
+
+def iter_window_features(chunks, window, step, features=FEATURES):
+    """ Computes window features over a stream given in chunks.
+
+    Rows of a chunk that start a window ending in the next chunk are
+    carried over, and rows skipped between windows are dropped across
+    chunk boundaries, so windows match those over the whole stream while
+    only about one chunk is held at a time.
+
+    Parameters:
+        chunks (iterable): (ts, values) pairs of int64 UTC microsecond
+            timestamps and (rows, columns) values, in time order.
+        window (int): Rows per window.
+        step (int): Rows between window starts.
+
+    Yields:
+        np.ndarray: int64 UTC microsecond start of each window.
+        dict: window_features of those windows.
+    """
+    assert(window > 0 and step > 0)
+    carry_ts = None
+    carry = None
+    # rows before the next window start still to come, when step > window
+    skip = 0
+    for ts, values in chunks:
+        values = values.reshape(len(values), -1)
+        if skip:
+            dropped = min(skip, len(values))
+            ts, values = ts[dropped:], values[dropped:]
+            skip -= dropped
+            if not len(values):
+                continue
+        if carry is not None and len(carry):
+            ts = np.concatenate((carry_ts, ts))
+            values = np.concatenate((carry, values))
+        windows = sliding_windows(values, window, step)
+        n = len(windows)
+        if n:
+            yield ts[:n * step:step], window_features(windows, features)
+        carry_ts = ts[n * step:]
+        carry = values[n * step:]
+        skip = max(n * step - len(values), 0)
+
+
+def feature_frame(starts, feats, axes, tz):
+    """ Returns one stream's window features as a DataFrame.
+
+    Per-axis features become <axis>_<feature> columns.
+    """
+    columns = {'start': us_to_index(starts, tz)}
+    for f, v in feats.items():
+        if f in AXIS_FEATURES:
+            for i, a in enumerate(axes):
+                columns[f"{a}_{f}"] = v[:, i]
+        else:
+            columns[f] = v
+    return pd.DataFrame(columns)
+
+
+def stream_features(chunks, window, step, axes, tz, features=FEATURES):
+    """ Returns the window features of a stream of DataFrame chunks. """
+    parts = list(iter_window_features(
+        ((index_to_us(df.index), df.to_numpy()) for df in chunks),
+        window,
+        step,
+        features
+    ))
+    if not parts:
+        return feature_frame(
+            np.empty(0, dtype=np.int64),
+            window_features(np.empty((0, window, len(axes))), features),
+            axes,
+            tz
+        )
+    return feature_frame(
+        np.concatenate([s for s, _ in parts]),
+        {f: np.concatenate([p[f] for _, p in parts]) for f in features},
+        axes,
+        tz
+    )
@@ -0,0 +1,157 @@
+""" Lazily loaded Session data mappings """
+
+from collections.abc import MutableMapping
+import timeit
+
+
+class LazyFolder(MutableMapping):
+    """ data[folder] mapping of types to DataFrames read on first access. """
+
+    def __init__(self, name, reader, transforms, time=False):
+        """ Initialize LazyFolder.
+
+        Parameters:
+            name (string): Data folder name, used for timing output.
+            reader (callable): Reads a stream location into a DataFrame.
+            transforms (list of callables): Shared list of in-place frame
+                transforms to apply to each stream as it is read.
+
+        Keyword Arguments:
+            time (bool): set True to print elapsed time per read.
+        """
+        self.name = name
+        self.locs = {}
+        self.frames = {}
+        self.reader = reader
+        self.transforms = transforms
+        self.time = time
+
+    def read(self, t):
+        """ Reads and transforms stream t without caching it. """
+        if self.time:
+            st = timeit.default_timer()
+        df = self.reader(self.locs[t])
+        for fn in self.transforms:
+            fn(df)
+        if self.time:
+            print(
+                f"Loaded {self.name} {t} in "
+                f"{timeit.default_timer() - st} s"
+            )
+        return df
+
+    def is_loaded(self, t):
+        """ Returns True if stream t is held in memory. """
+        return t in self.frames
+
+    def peek(self, t):
+        """ Returns stream t, reading it without caching if not loaded. """
+        if t in self.frames:
+            return self.frames[t]
+        return self.read(t)
+
+    def __getitem__(self, t):
+        if t not in self.frames:
+            if t not in self.locs:
+                raise KeyError(t)
+            self.frames[t] = self.read(t)
+        return self.frames[t]
+
+    def __setitem__(self, t, df):
+        self.frames[t] = df
+
+    def __delitem__(self, t):
+        if t not in self.frames and t not in self.locs:
+            raise KeyError(t)
+        self.frames.pop(t, None)
+        self.locs.pop(t, None)
+
+    def __iter__(self):
+        yield from self.locs
+        yield from (t for t in self.frames if t not in self.locs)
+
+    def __len__(self):
+        return len(self.locs.keys() | self.frames.keys())
+
+    def __repr__(self):
+        loaded = [t for t in self if self.is_loaded(t)]
+        return f"LazyFolder({list(self)}, loaded={loaded})"
+
+
+class LazyData(MutableMapping):
+    """ Nested data[folder][type] mapping that reads streams on access.
+
+    Behaves like the dict returned by dataio.load, but each DataFrame is
+    only read the first time it is accessed and is then kept in memory.
+    """
+
+    def __init__(self, locs, reader, time=False):
+        """ Initialize LazyData.
+
+        Parameters:
+            locs (list of tuples): (folder, data folder, type, location)
+                entries as returned by dataio.stream_locs.
+            reader (callable): Reads a stream location into a DataFrame.
+
+        Keyword Arguments:
+            time (bool): set True to print elapsed time per read.
+        """
+        self.reader = reader
+        self.transforms = []
+        self.time = time
+        self.folders = {}
+        for _, data_folder, t, loc in locs:
+            self._folder(data_folder).locs[t] = loc
+
+    def _folder(self, data_folder):
+        """ Returns the LazyFolder for data_folder, creating it if needed. """
+        if data_folder not in self.folders:
+            self.folders[data_folder] = LazyFolder(
+                data_folder, self.reader, self.transforms, time=self.time
+            )
+        return self.folders[data_folder]
+
+    def transform(self, fn):
+        """ Applies in-place frame transform fn to every stream.
+
+        Loaded streams are transformed immediately, the rest as they are
+        read.
+        """
+        for folder in self.folders.values():
+            for df in folder.frames.values():
+                fn(df)
+        self.transforms.append(fn)
+
+    def is_loaded(self, data_folder, t):
+        """ Returns True if data[data_folder][t] is held in memory. """
+        return self.folders[data_folder].is_loaded(t)
+
+    def peek(self, data_folder, t):
+        """ Returns data[data_folder][t] without caching it if not loaded. """
+        return self.folders[data_folder].peek(t)
+
+    def load_all(self):
+        """ Reads every stream into memory. """
+        for folder in self.folders.values():
+            for t in folder:
+                folder[t]
+
+    def __getitem__(self, data_folder):
+        return self.folders[data_folder]
+
+    def __setitem__(self, data_folder, value):
+        folder = self._folder(data_folder)
+        folder.locs.clear()
+        folder.frames = dict(value)
+
+    def __delitem__(self, data_folder):
+        del self.folders[data_folder]
+
+    def __iter__(self):
+        return iter(self.folders)
+
+    def __len__(self):
+        return len(self.folders)
+
+    def __repr__(self):
+        return f"LazyData({self.folders})"
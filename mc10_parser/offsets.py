@@ -0,0 +1,177 @@
+""" Sparse timestamp to byte offset indexes for MC10 sensor CSVs """
+
+from io import BytesIO
+import numpy as np
+import os
+
+from .dataio import (
+    file_version,
+    open_path,
+    read_stream,
+    s3_filesystem,
+    to_frame
+)
+from .times import index_to_us
+
+EXTENSION = '.offsets.npz'
+EVERY = 4096
+BLOCK_SIZE = 1 << 24
+
+
+def index_path(data_loc):
+    """ Returns the offset index location for the CSV at data_loc. """
+    return os.path.splitext(data_loc)[0] + EXTENSION
+
+
+def build(f, every=EVERY, block_size=BLOCK_SIZE):
+    """ Scans an MC10 CSV and indexes the byte offset of every nth row.
+
+    Parameters:
+        f (file): Binary MC10 CSV positioned at its header line.
+
+    Keyword Arguments:
+        every (int): Number of rows between indexed offsets.
+        block_size (int): Bytes read per block while scanning.
+
+    Returns:
+        dict: 'header' line bytes, indexed 'ts' (int64 microseconds) and
+            their byte 'offsets', the 'last' timestamp and file 'size'.
+    """
+    header = f.readline()
+    pos = len(header)
+    rows = 0
+    ts, offsets = [], []
+    last = -1
+
+    def add_lines(buf, starts, base):
+        """ Indexes the lines of buf beginning at starts. """
+        nonlocal rows, last
+        for i in np.flatnonzero((rows + np.arange(len(starts))) % every == 0):
+            s = starts[i]
+            ts.append(int(buf[s:buf.index(b',', s)]))
+            offsets.append(base + s)
+        s = starts[-1]
+        last = int(buf[s:buf.index(b',', s)])
+        rows += len(starts)
+
+    carry = b''
+    while True:
+        block = f.read(block_size)
+        if not block:
+            break
+        buf = carry + block
+        base = pos - len(carry)
+        pos += len(block)
+        newlines = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == 10)
+        if len(newlines):
+            starts = np.concatenate(([0], newlines[:-1] + 1))
+            add_lines(buf, starts, base)
+            carry = buf[newlines[-1] + 1:]
+        else:
+            carry = buf
+
+    # a final line without a trailing newline
+    if carry.strip():
+        add_lines(carry, np.array([0]), pos - len(carry))
+
+    return {
+        'header': np.frombuffer(header, dtype=np.uint8),
+        'ts': np.array(ts, dtype=np.int64),
+        'offsets': np.array(offsets, dtype=np.int64),
+        'last': np.int64(last),
+        'size': np.int64(pos),
+    }
+
+
+def load_index(data_loc, s3_creds=None, every=EVERY, persist=True):
+    """ Returns the offset index of data_loc, building it if needed.
+
+    The index is persisted next to the CSV (<folder>/<type>.offsets.npz)
+    and rebuilt when the CSV's size/mtime (or S3 ETag) changes.
+
+    Parameters:
+        data_loc (string): Local path or S3 key of an MC10 CSV.
+
+    Keyword Arguments:
+        s3_creds (dict): S3 credentials, set when data_loc is an S3 key.
+        every (int): Number of rows between indexed offsets.
+        persist (bool): set False to skip writing a newly built index.
+    """
+    fs = s3_filesystem(s3_creds) if s3_creds else None
+    path = index_path(data_loc)
+    version = file_version(data_loc, fs)
+
+    try:
+        with open_path(path, 'rb', fs) as f:
+            index = dict(np.load(BytesIO(f.read())))
+        if str(index['version']) == version:
+            return index
+    except (OSError, KeyError, ValueError):
+        pass
+
+    with open_path(data_loc, 'rb', fs) as f:
+        index = build(f, every=every)
+    index['version'] = np.array(version)
+    if persist:
+        buf = BytesIO()
+        np.savez(buf, **index)
+        try:
+            with open_path(path, 'wb', fs) as f:
+                f.write(buf.getvalue())
+        except OSError:
+            pass
+    return index
+
+
+def byte_range(index, start, end):
+    """ Returns the [first, last) byte range covering start <= ts < end. """
+    ts = index['ts']
+    i0 = max(np.searchsorted(ts, start, side='right') - 1, 0)
+    i1 = np.searchsorted(ts, end, side='left')
+    first = int(index['offsets'][i0]) if len(ts) else int(index['size'])
+    last = int(index['offsets'][i1]) if i1 < len(ts) else int(index['size'])
+    return first, last
+
+
+def read_window(
+    data_loc, tz, start, end, s3_creds=None, every=EVERY, **kwargs
+):
+    """ Reads the rows of an MC10 CSV with start <= timestamp < end.
+
+    Only the byte range located through the offset index is read, using
+    range requests for S3 keys.
+
+    Parameters:
+        data_loc (string): Local path or S3 key of an MC10 CSV.
+        tz (pytz.timezone): Timezone to convert the UTC index to.
+        start (int): Window start in UTC microseconds.
+        end (int): Window end in UTC microseconds.
+
+    Keyword Arguments:
+        s3_creds (dict): S3 credentials, set when data_loc is an S3 key.
+        every (int): Number of rows between indexed offsets.
+        **kwargs: Parser options passed to dataio.read_stream.
+    """
+    index = load_index(data_loc, s3_creds=s3_creds, every=every)
+    first, last = byte_range(index, start, end)
+    fs = s3_filesystem(s3_creds) if s3_creds else None
+    with open_path(data_loc, 'rb', fs) as f:
+        f.seek(first)
+        chunk = f.read(last - first)
+
+    df = read_stream(
+        BytesIO(index['header'].tobytes() + chunk), tz, **kwargs
+    )
+    ts = index_to_us(df.index)
+    df = df.iloc[np.searchsorted(ts, start):np.searchsorted(ts, end)]
+    if not len(df):
+        # the pandas parser gives header-only CSVs object columns and a
+        # datetime64[s] index, so match the dtypes of an in-memory slice
+        values = df.to_numpy()
+        if values.dtype == object:
+            values = values.astype(np.float64)
+        return to_frame(
+            np.empty(0, dtype=np.int64), values, df.columns, df.index.name,
+            tz
+        )
+    return df
@@ -0,0 +1,271 @@
+""" Multi-resolution min/max/mean overviews of MC10 sensor streams """
+
+from io import BytesIO
+import itertools
+import numpy as np
+import pandas as pd
+import posixpath
+
+from .annotations import to_us
+from .times import index_to_us, us_to_index
+
+EXTENSION = '.overview.npz'
+# samples per bucket of the finest level
+BUCKET_ROWS = 64
+# buckets of one level merged into each bucket of the next
+FACTOR = 4
+CHUNK_ROWS = 1 << 16
+STATS = ['ts', 'count', 'min', 'max', 'sum']
+
+
+def sidecar_path(data_loc, t):
+    """ Returns the overview location for the stream of type t at data_loc.
+    """
+    return f"{posixpath.dirname(data_loc)}/{t}{EXTENSION}"
+
+
+def bucket_stats(ts, values, rows):
+    """ Returns the stats of consecutive buckets of rows samples.
+
+    The last bucket holds whatever samples remain. Sums are kept instead of
+    means so that buckets merge exactly.
+    """
+    if not len(ts):
+        return empty_level(values.shape[1], values.dtype)
+    starts = np.arange(0, len(ts), rows)
+    return {
+        'ts': ts[starts],
+        'count': np.diff(np.r_[starts, len(ts)]),
+        'min': np.minimum.reduceat(values, starts, axis=0),
+        'max': np.maximum.reduceat(values, starts, axis=0),
+        'sum': np.add.reduceat(values, starts, axis=0, dtype=np.float64)
+    }
+
+
+def empty_level(columns, dtype=np.float64):
+    """ Returns a level without buckets. """
+    return {
+        'ts': np.empty(0, dtype=np.int64),
+        'count': np.empty(0, dtype=np.int64),
+        'min': np.empty((0, columns), dtype=dtype),
+        'max': np.empty((0, columns), dtype=dtype),
+        'sum': np.empty((0, columns), dtype=np.float64)
+    }
+
+
+def concat_levels(levels, columns):
+    """ Concatenates levels of consecutive stretches of a stream. """
+    levels = [level for level in levels if len(level['ts'])]
+    if not levels:
+        return empty_level(columns)
+    return {
+        k: np.concatenate([level[k] for level in levels]) for k in STATS
+    }
+
+
+def coarsen(level, factor):
+    """ Merges every factor consecutive buckets of a level. """
+    starts = np.arange(0, len(level['ts']), factor)
+    return {
+        'ts': level['ts'][starts],
+        'count': np.add.reduceat(level['count'], starts),
+        'min': np.minimum.reduceat(level['min'], starts, axis=0),
+        'max': np.maximum.reduceat(level['max'], starts, axis=0),
+        'sum': np.add.reduceat(level['sum'], starts, axis=0)
+    }
+
+
+class Overview:
+    """ Min/max/mean pyramid of one stream for browsing at any zoom.
+
+    The finest level summarizes every bucket_rows samples; each coarser
+    level merges factor buckets of the one below, down to a single bucket,
+    so a whole recording can be drawn from a few thousand buckets without
+    reading its samples.
+    """
+
+    def __init__(
+        self, base, columns, tz, index_name=None, bucket_rows=BUCKET_ROWS,
+        factor=FACTOR
+    ):
+        """ Initialize Overview from its finest level.
+
+        Parameters:
+            base (dict): Finest level from bucket_stats.
+            columns (list of strings): Value column names.
+            tz (pytz.timezone): Timezone for naive query times and results.
+
+        Keyword Arguments:
+            index_name (string): Timestamp column name.
+            bucket_rows (int): Samples per bucket of the finest level.
+            factor (int): Buckets merged per bucket of the next level.
+        """
+        assert(bucket_rows > 0 and factor > 1)
+        self.columns = list(columns)
+        self.tz = tz
+        self.index_name = index_name
+        self.bucket_rows = bucket_rows
+        self.factor = factor
+        self.levels = [base]
+        while len(self.levels[-1]['ts']) > 1:
+            self.levels.append(coarsen(self.levels[-1], factor))
+
+    @classmethod
+    def fromchunks(
+        cls, chunks, columns, tz, bucket_rows=BUCKET_ROWS, **kwargs
+    ):
+        """ Builds an Overview in one pass over a stream given in chunks.
+
+        Rows that do not fill a bucket are carried over to the next chunk,
+        so only about one chunk is held at a time.
+
+        Parameters:
+            chunks (iterable): (ts, values) pairs of int64 UTC microsecond
+                timestamps and (rows, columns) values, in time order.
+            columns (list of strings): Value column names.
+            tz (pytz.timezone): Timezone for queries.
+        """
+        parts = []
+        carry_ts = np.empty(0, dtype=np.int64)
+        carry = None
+        for ts, values in chunks:
+            values = values.reshape(len(ts), -1)
+            if carry is not None and len(carry):
+                ts = np.concatenate((carry_ts, ts))
+                values = np.concatenate((carry, values))
+            n = len(ts) // bucket_rows * bucket_rows
+            if n:
+                parts.append(bucket_stats(ts[:n], values[:n], bucket_rows))
+            carry_ts, carry = ts[n:], values[n:]
+        if carry is not None and len(carry):
+            parts.append(bucket_stats(carry_ts, carry, bucket_rows))
+        return cls(
+            concat_levels(parts, len(columns)),
+            columns,
+            tz,
+            bucket_rows=bucket_rows,
+            **kwargs
+        )
+
+    @classmethod
+    def fromframes(cls, frames, tz, **kwargs):
+        """ Builds an Overview from a stream of DataFrame chunks.
+
+        A stream without chunks gives an empty Overview without columns.
+        """
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
+            return cls(empty_level(0), [], tz, **kwargs)
+        chunks = (
+            (index_to_us(df.index), df.to_numpy())
+            for df in itertools.chain([first], frames)
+        )
+        return cls.fromchunks(
+            chunks, list(first.columns), tz, index_name=first.index.name,
+            **kwargs
+        )
+
+    @classmethod
+    def fromcolumns(cls, ts, columns, names, tz, rows=CHUNK_ROWS, **kwargs):
+        """ Builds an Overview from timestamps and value columns, rows at a
+        time. """
+        chunks = (
+            (ts[i:i + rows], np.column_stack([c[i:i + rows] for c in columns]))
+            for i in range(0, len(ts), rows)
+        )
+        return cls.fromchunks(chunks, list(names), tz, **kwargs)
+
+    @classmethod
+    def concat(cls, overviews, tz):
+        """ Joins the Overviews of consecutive segments of a stream.
+
+        Columns are taken from the first segment that has any, so empty
+        segments are skipped.
+        """
+        first = next((o for o in overviews if o.columns), overviews[0])
+        return cls(
+            concat_levels(
+                [o.levels[0] for o in overviews], len(first.columns)
+            ),
+            first.columns,
+            tz,
+            index_name=first.index_name,
+            bucket_rows=first.bucket_rows,
+            factor=first.factor
+        )
+
+    def tobytes(self, version=''):
+        """ Serializes the finest level, tagged with a source version. """
+        buf = BytesIO()
+        np.savez(
+            buf,
+            columns=np.array(self.columns, dtype=str),
+            index_name=np.array(self.index_name or ''),
+            bucket_rows=np.int64(self.bucket_rows),
+            factor=np.int64(self.factor),
+            version=np.array(version),
+            **self.levels[0]
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def frombytes(cls, raw, tz):
+        """ Returns the Overview and source version serialized by tobytes. """
+        f = np.load(BytesIO(raw))
+        overview = cls(
+            {k: f[k] for k in STATS},
+            f['columns'].tolist(),
+            tz,
+            index_name=str(f['index_name']) or None,
+            bucket_rows=int(f['bucket_rows']),
+            factor=int(f['factor'])
+        )
+        return overview, str(f['version'])
+
+    def level_rows(self, level):
+        """ Returns the samples per full bucket of level. """
+        return self.bucket_rows * self.factor ** level
+
+    def query(self, start=None, end=None, pixels=1000):
+        """ Returns the finest level that fits start to end in pixels.
+
+        Naive times are taken to be in the Overview timezone; ints are UTC
+        microseconds.
+
+        Keyword Arguments:
+            start (datetime-like): Span start, the stream start if None.
+            end (datetime-like): Span end, the stream end if None.
+            pixels (int): Largest number of buckets to return.
+
+        Returns:
+            DataFrame: One row per bucket overlapping the span, indexed by
+                bucket start, with <column>_min, <column>_max and
+                <column>_mean columns and the sample count.
+        """
+        assert(pixels > 0)
+        for level in self.levels:
+            ts = level['ts']
+            lo = 0
+            if start is not None:
+                lo = max(
+                    np.searchsorted(ts, to_us(start, self.tz), 'right') - 1,
+                    0
+                )
+            hi = len(ts)
+            if end is not None:
+                hi = np.searchsorted(ts, to_us(end, self.tz), 'left')
+            if hi - lo <= pixels:
+                break
+
+        count = level['count'][lo:hi]
+        columns = {}
+        for i, c in enumerate(self.columns):
+            columns[f"{c}_min"] = level['min'][lo:hi, i]
+            columns[f"{c}_max"] = level['max'][lo:hi, i]
+            columns[f"{c}_mean"] = level['sum'][lo:hi, i] / count
+        columns['count'] = count
+        return pd.DataFrame(
+            columns,
+            index=us_to_index(level['ts'][lo:hi], self.tz, self.index_name)
+        )
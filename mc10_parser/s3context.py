@@ -0,0 +1,153 @@
+""" Shared, connection-pooled S3 clients """
+
+import boto3
+from botocore.config import Config
+from s3fs.core import S3FileSystem
+
+
+class S3Context:
+    """ One set of pooled S3 clients shared across Session loads and dumps.
+
+    Building boto3 sessions, resources and S3 filesystems resolves
+    credentials and opens new connections each time. An S3Context builds
+    them once so bulk jobs reuse warm connections; pass it as s3= to
+    Session.froms3/setup_s3, or in place of an S3 resource to dictio and
+    dataio helpers. Contexts can be pickled for process pools, in which
+    case each process builds its own clients on first use.
+    """
+
+    def __init__(
+        self, access_key=None, secret_key=None, max_pool_connections=50,
+        retries=5, endpoint_url=None, region_name=None
+    ):
+        """ Initialize S3Context.
+
+        Keyword Arguments:
+            access_key (string): AWS access key, None for the default
+                credential chain.
+            secret_key (string): AWS secret key.
+            max_pool_connections (int): Connections kept per client.
+            retries (int): Maximum attempts per request.
+            endpoint_url (string): Alternative S3 endpoint, e.g. a local
+                S3 stand-in.
+            region_name (string): AWS region.
+        """
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.max_pool_connections = max_pool_connections
+        self.retries = retries
+        self.endpoint_url = endpoint_url
+        self.region_name = region_name
+        self._reset()
+
+    def _reset(self):
+        """ Drops built clients so they are rebuilt on next use. """
+        self._session = None
+        self._resource = None
+        self._fs = None
+
+    @property
+    def creds(self):
+        """ Credentials dict in the format used by dataio. """
+        return {'access_key': self.access_key, 'secret_key': self.secret_key}
+
+    @property
+    def config(self):
+        """ botocore Config with the pool size and retry settings. """
+        return Config(
+            max_pool_connections=self.max_pool_connections,
+            retries={'max_attempts': self.retries, 'mode': 'standard'}
+        )
+
+    @property
+    def session(self):
+        """ boto3 Session for the context credentials. """
+        if self._session is None:
+            self._session = boto3.Session(
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                region_name=self.region_name
+            )
+        return self._session
+
+    @property
+    def resource(self):
+        """ Pooled boto3 S3 resource. """
+        if self._resource is None:
+            self._resource = self.session.resource(
+                's3', config=self.config, endpoint_url=self.endpoint_url
+            )
+        return self._resource
+
+    @property
+    def client(self):
+        """ Pooled boto3 S3 client underlying resource. """
+        return self.resource.meta.client
+
+    @property
+    def fs(self):
+        """ Pooled S3FileSystem for reads through s3fs. """
+        if self._fs is None:
+            client_kwargs = {}
+            if self.endpoint_url:
+                client_kwargs['endpoint_url'] = self.endpoint_url
+            if self.region_name:
+                client_kwargs['region_name'] = self.region_name
+            self._fs = S3FileSystem(
+                anon=False,
+                key=self.access_key,
+                secret=self.secret_key,
+                client_kwargs=client_kwargs,
+                config_kwargs={
+                    'max_pool_connections': self.max_pool_connections,
+                    'retries': {
+                        'max_attempts': self.retries, 'mode': 'standard'
+                    },
+                }
+            )
+        return self._fs
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_session=None, _resource=None, _fs=None)
+        return state
+
+
+def s3_resource(s3):
+    """ Returns the boto3 S3 resource of an S3Context or resource. """
+    return s3.resource if isinstance(s3, S3Context) else s3
+
+
+def list_prefix(client, bucket_name, prefix, delimiter=None):
+    """ Lists every key and common prefix under prefix, page by page.
+
+    Parameters:
+        client (botocore.client.S3): S3 client to list with.
+        bucket_name (string): Bucket to list.
+        prefix (string): Key prefix to list under.
+
+    Keyword Arguments:
+        delimiter (string): Groups keys past the next delimiter into common
+            prefixes, e.g. '/' to list one directory level.
+
+    Returns:
+        list: Keys under prefix.
+        list: Common prefixes under prefix, when delimiter is set.
+    """
+    kwargs = {'Bucket': bucket_name, 'Prefix': prefix}
+    if delimiter:
+        kwargs['Delimiter'] = delimiter
+    keys, prefixes = [], []
+    for page in client.get_paginator('list_objects_v2').paginate(**kwargs):
+        keys += [o['Key'] for o in page.get('Contents', [])]
+        prefixes += [p['Prefix'] for p in page.get('CommonPrefixes', [])]
+    return keys, prefixes
+
+
+def list_etags(client, bucket_name, prefix):
+    """ Returns the ETag of every key under prefix, listed page by page. """
+    etags = {}
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        etags.update((o['Key'], o['ETag']) for o in page.get('Contents', []))
+    return etags
@@ -0,0 +1,113 @@
+""" Streaming multipart uploads to S3 """
+
+import io
+
+PART_SIZE = 8 << 20
+MIN_PART_SIZE = 5 << 20
+ACL = 'bucket-owner-full-control'
+
+
+class MultipartWriter(io.RawIOBase):
+    """ Writable file object streaming its contents to an S3 object.
+
+    Writes are buffered up to part_size bytes and sent as multipart upload
+    parts, so memory use stays at one part no matter how much is written.
+    Objects smaller than one part are sent with a single put_object call.
+    The upload completes on close and is aborted if the writer is left
+    through an exception.
+    """
+
+    def __init__(self, client, bucket_name, key, part_size=PART_SIZE):
+        """ Initialize MultipartWriter.
+
+        Parameters:
+            client (botocore.client.S3): S3 client to upload with.
+            bucket_name (string): Bucket to write to.
+            key (string): Object key to write.
+
+        Keyword Arguments:
+            part_size (int): Bytes buffered per part, at least 5 MiB.
+        """
+        super().__init__()
+        self.client = client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self.closed:
+            raise ValueError("write to closed MultipartWriter")
+        self.buffer += b
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(b)
+
+    def _upload_part(self, body):
+        """ Sends body as the next part, starting the upload if needed. """
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket_name, Key=self.key, ACL=ACL
+            )['UploadId']
+        number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=number,
+            Body=body
+        )
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': number})
+
+    def close(self):
+        """ Uploads any buffered bytes and completes the upload. """
+        if self.closed:
+            return
+        try:
+            if self.upload_id is None:
+                self.client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    ACL=ACL,
+                    Body=bytes(self.buffer)
+                )
+            else:
+                if self.buffer:
+                    self._upload_part(bytes(self.buffer))
+                self.client.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                    MultipartUpload={'Parts': self.parts}
+                )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self.buffer = bytearray()
+            super().close()
+
+    def abort(self):
+        """ Abandons the upload, discarding any parts already sent. """
+        if self.upload_id is not None:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.key,
+                UploadId=self.upload_id
+            )
+            self.upload_id = None
+        self.buffer = bytearray()
+        if not self.closed:
+            super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
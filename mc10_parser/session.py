@@ -1,8 +1,12 @@
 """ MC10 data file loading, manipulation, and saving """
 
-import boto3
+from functools import partial
+from itertools import chain
+import numpy as np
 import os
+import pandas as pd
 import pathlib
+from pytz import timezone
 import re
 
 from .dictio import (
@@ -12,12 +16,42 @@ from .dictio import (
     data_dict_from_s3
 )
 from .dataio import (
+    MASKS,
+    TYPES,
+    file_version,
+    folder_of,
+    iter_frames,
+    open_path,
+    open_stream,
+    s3_filesystem,
+    sampling_period,
+    to_frame,
+    map_ordered,
     load_local as io_load_local,
     load_mem as io_load_mem,
     load_s3 as io_load_s3,
     dump_local as io_dump_local,
     dump_s3 as io_dump_s3
 )
+from .align import column_names, interpolate, uniform_grid
+from .annotations import AnnotationIndex
+from .coverage import FILENAME as COVERAGE, CoverageIndex, stream_runs
+from .features import FEATURES, stream_features
+from .chunks import (
+    CHUNK_ROWS,
+    iter_frame,
+    iter_stream,
+    rechunk_duration,
+    rechunk_rows,
+    to_duration_us
+)
+from .lazy import LazyData
+from .overview import Overview, sidecar_path
+from .s3context import S3Context
+from .shift import shift_frame
+from .stream import SegmentedStream, Stream, as_frame, stream_ts
+from .times import timestamp_to_us
+from .offsets import read_window
 
 
 class Session:
@@ -25,34 +59,56 @@ class Session:
 
     def __init__(self):
         """ Initialize Session. """
-        pass
+        # target date of a deferred date_shift, applied on dump
+        self.shift_date = None
+        self.s3 = None
+        self.coverage = None
+        # overview pyramids by (folder, type), see overview
+        self.overviews = {}
 
     @classmethod
-    def fromlocal(cls, filepath, time=False):
-        """ Initialize and load Session from filepath. """
+    def fromlocal(cls, filepath, time=False, **kwargs):
+        """ Initialize and load Session from filepath.
+
+        Additional keyword arguments are passed through to dataio.load.
+        """
         s = cls()
-        s.set_class_vars(*s.load_local(filepath, time=time))
+        s.set_class_vars(*s.load_local(filepath, time=time, **kwargs))
         s.s3_session = None
         s.s3_resource = None
+        s.load_coverage()
         return s
 
     @classmethod
-    def frommem(cls, metadata, data, time=False):
-        """ Initialize and load Session from metadata/data in memory. """
+    def frommem(cls, metadata, data, time=False, **kwargs):
+        """ Initialize and load Session from metadata/data in memory.
+
+        Additional keyword arguments are passed through to dataio.load.
+        """
         s = cls()
-        s.set_class_vars(*s.load_mem(metadata, data, time=time))
+        s.set_class_vars(*s.load_mem(metadata, data, time=time, **kwargs))
         s.s3_session = None
         s.s3_resource = None
+        s.load_coverage()
         return s
 
     @classmethod
-    def froms3(cls, bucket_name, access_key, secret_key, filepath, time=False):
-        """ Initialize and load Session from S3 data and path """
+    def froms3(
+        cls, bucket_name, access_key, secret_key, filepath, time=False,
+        s3=None, **kwargs
+    ):
+        """ Initialize and load Session from S3 data and path
+
+        Pass a shared S3Context as s3 (with None keys) to reuse its pooled
+        clients across Sessions. Additional keyword arguments are passed
+        through to dataio.load.
+        """
         s = cls()
-        s.setup_s3(access_key, secret_key)
+        s.setup_s3(access_key, secret_key, s3=s3)
         s.set_class_vars(
-            *s.load_s3(bucket_name, filepath, time=time)
+            *s.load_s3(bucket_name, filepath, time=time, **kwargs)
         )
+        s.load_coverage(bucket_name)
         return s
 
     def set_class_vars(self, metadata, data, annotations):
@@ -60,20 +116,18 @@ class Session:
         self.metadata = metadata
         self.data = data
         self.annotations = annotations
-
-    def setup_s3(self, access_key, secret_key):
-        """ Create S3 resource given credentials. """
-        self.s3_creds = {
-            'access_key': access_key,
-            'secret_key': secret_key
-        }
-        self.s3_session = boto3.Session(
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-        )
-        self.s3_resource = self.s3_session.resource('s3')
-
-    def load_local(self, filepath, time=False):
+        self.overviews = {}
+
+    def setup_s3(self, access_key=None, secret_key=None, s3=None):
+        """ Create S3 resource given credentials or a shared S3Context. """
+        if s3 is None:
+            s3 = S3Context(access_key, secret_key)
+        self.s3 = s3
+        self.s3_creds = s3.creds
+        self.s3_session = s3.session
+        self.s3_resource = s3.resource
+
+    def load_local(self, filepath, time=False, **kwargs):
         """ Load Session from metadata specified at filepath.
 
         Parameters:
@@ -81,6 +135,8 @@ class Session:
 
         Keyword Arguments:
             time (bool): set True to print elapsed time.
+            **kwargs: Load options (workers, executor, ...) passed through
+                to dataio.load.
 
         Returns:
             dict: Metadata dictionary for the loaded session.
@@ -90,9 +146,9 @@ class Session:
         assert(isinstance(filepath, str))
         metadata = data_dict_from_file(filepath)
         metadata['loc'] = os.path.dirname(filepath) + '/'
-        return (metadata, *io_load_local(metadata, time=time))
+        return (metadata, *io_load_local(metadata, time=time, **kwargs))
 
-    def load_mem(self, metadata, data, time=False):
+    def load_mem(self, metadata, data, time=False, **kwargs):
         """ Load Session from data in memory.
 
         Parameters:
@@ -100,6 +156,8 @@ class Session:
 
         Keyword Arguments:
             time (bool): set True to print elapsed time.
+            **kwargs: Load options (workers, executor, ...) passed through
+                to dataio.load.
 
         Returns:
             dict: Metadata dictionary for the loaded session.
@@ -107,10 +165,13 @@ class Session:
                   types as secondary keys.
         """
         # TODO assert correct metadata
-        data.update(metadata)
-        return (metadata, *io_load_mem(data, time=time))
+        # annotation text in data['meta'] takes precedence over the
+        # annotations filename kept in metadata['meta']
+        return (metadata, *io_load_mem(
+            {**metadata, **data}, time=time, **kwargs
+        ))
 
-    def load_s3(self, bucket_name, filepath, time=False):
+    def load_s3(self, bucket_name, filepath, time=False, **kwargs):
         """ Load Session from metadata specified at S3 location.
 
         Parameters:
@@ -119,6 +180,8 @@ class Session:
         Keyword Arguments:
             bucket_name (string): S3 bucket to write to.
             time (bool): set True to print elapsed time.
+            **kwargs: Load options (workers, executor, ...) passed through
+                to dataio.load.
 
         Returns:
             dict: Metadata dictionary for the loaded session.
@@ -130,10 +193,80 @@ class Session:
 
         metadata = data_dict_from_s3(self.s3_resource, bucket_name, filepath)
         return (metadata, *io_load_s3(
-            self.s3_creds, bucket_name, metadata, time=time
+            self.s3, bucket_name, metadata, time=time, **kwargs
         ))
 
-    def dump(self, filepath, time=False):
+    def load_coverage(self, bucket_name=None):
+        """ Sets the coverage index of the loaded streams.
+
+        The index is built from the timestamps of streams in memory. Lazy
+        Sessions read it from the coverage sidecar written by dump, when
+        there is one, so no stream is read; otherwise it is built on the
+        first call to coverage_index.
+
+        Keyword Arguments:
+            bucket_name (string): S3 bucket the Session was loaded from.
+        """
+        self.coverage = None
+        if not isinstance(self.data, LazyData):
+            self.coverage = self.build_coverage()
+        elif self.metadata.get('coverage') and 'loc' in self.metadata:
+            loc = self.metadata['loc'] + self.metadata['coverage']
+            s3_creds = None
+            if bucket_name:
+                loc = f"s3://{bucket_name}/{loc}"
+                s3_creds = self.s3
+            try:
+                with open_stream(loc, s3_creds) as f:
+                    self.coverage = CoverageIndex.read_csv(
+                        f, timezone(self.metadata['timezone'])
+                    )
+            except FileNotFoundError:
+                pass
+
+    def build_coverage(self):
+        """ Returns a CoverageIndex built from every stream's timestamps.
+
+        A gap is a step longer than twice the metadata sampling period (or
+        the median step, when there is no rate). Streams of a lazy Session
+        are read without being kept.
+        """
+        return CoverageIndex.fromruns(
+            (
+                (
+                    folder_of(self.metadata, k1),
+                    k1,
+                    k2,
+                    stream_runs(stream_ts(df), sampling_period(
+                        self.metadata, folder_of(self.metadata, k1), k2
+                    ))
+                ) for k1, k2, df in iter_frames(self.data)
+            ),
+            timezone(self.metadata['timezone'])
+        )
+
+    def coverage_index(self):
+        """ Returns the coverage index, building it if not loaded yet.
+
+        Use its continuous method to find the streams covering a time span
+        and gaps to list dropouts and gaps between segments.
+        """
+        if self.coverage is None:
+            self.coverage = self.build_coverage()
+        return self.coverage
+
+    def set_format(self, format, compression=None):
+        """ Records the stream file format of a dump in the metadata. """
+        if format == 'csv':
+            self.metadata.pop('format', None)
+        else:
+            self.metadata['format'] = format
+        if compression is None:
+            self.metadata.pop('compression', None)
+        else:
+            self.metadata['compression'] = compression
+
+    def dump(self, filepath, time=False, **kwargs):
         """ Dump Session as specified by metadata at filepath.
 
         Parameters:
@@ -141,6 +274,9 @@ class Session:
 
         Keyword Arguments:
             time (bool): set True to print elapsed time
+            **kwargs: Dump options passed through to dataio.dump. A
+                shift_date given here takes the place of a deferred
+                date_shift.
         """
         assert(isinstance(filepath, str))
 
@@ -148,14 +284,25 @@ class Session:
             re.sub('.*/', '', filepath), ''
         )
         self.metadata.pop('template_path', None)
+        self.set_format(
+            kwargs.get('format', 'csv'), kwargs.get('compression')
+        )
+        self.metadata['coverage'] = COVERAGE
         pathlib.Path(self.metadata['loc']).mkdir(
             parents=True, exist_ok=True
         )
         data_dict_to_file(self.metadata, filepath)
         self.metadata['loc'] = os.path.dirname(filepath) + '/'
-        io_dump_local(self.metadata, self.data, self.annotations, time=time)
+        kwargs.setdefault('shift_date', self.shift_date)
+        io_dump_local(
+            self.metadata,
+            self.data,
+            self.annotations,
+            time=time,
+            **kwargs
+        )
 
-    def dump_s3(self, bucket_name, filepath, time=False):
+    def dump_s3(self, bucket_name, filepath, time=False, **kwargs):
         """ Dump Session as specified by metadata at filepath.
 
         Parameters:
@@ -164,6 +311,9 @@ class Session:
 
         Keyword Arguments:
             time (bool): set True to print elapsed time
+            **kwargs: Dump options passed through to dataio.dump. A
+                shift_date given here takes the place of a deferred
+                date_shift.
         """
         assert(isinstance(filepath, str))
         assert(self.s3_session and self.s3_resource)
@@ -171,38 +321,488 @@ class Session:
         metadata_filename = re.sub('.*/', '', filepath)
         self.metadata['loc'] = filepath.replace(metadata_filename, '')
         self.metadata.pop('template_path', None)
-        data_dict_to_s3(
-            self.s3_resource,
-            bucket_name,
-            self.metadata,
-            metadata_filename
+        self.set_format(
+            kwargs.get('format', 'csv'), kwargs.get('compression')
         )
+        self.metadata['coverage'] = COVERAGE
+        kwargs.setdefault('shift_date', self.shift_date)
         io_dump_s3(
             self.s3_resource,
             bucket_name,
             self.metadata,
             self.data,
             self.annotations,
-            time=time
+            time=time,
+            **kwargs
         )
+        # written last so that its presence marks a complete dump
+        data_dict_to_s3(
+            self.s3_resource,
+            bucket_name,
+            self.metadata,
+            metadata_filename
+        )
+
+    def slice(self, start, end, folders=None, types=None, **kwargs):
+        """ Return the data recorded between start and end.
+
+        Streams held in memory are sliced directly. Unread streams of a
+        lazily loaded Session are read through a sparse timestamp to byte
+        offset index persisted next to each CSV, so only the byte range
+        covering the window is read (with range requests on S3).
+
+        Parameters:
+            start (datetime-like): Inclusive window start. Naive times are
+                in the Session timezone.
+            end (datetime-like): Exclusive window end.
+
+        Keyword Arguments:
+            folders (list of strings): Folders (or segment folders) to
+                include, all by default.
+            types (list of strings): Data types to include, all by default.
+            **kwargs: Parser options passed to dataio.read_stream.
+
+        Returns:
+            dict: Windowed data, with folders as top-level keys and data
+                  types as secondary keys.
+        """
+        tz = timezone(self.metadata['timezone'])
+        start = timestamp_to_us(start, tz)
+        end = timestamp_to_us(end, tz)
+        lazy = isinstance(self.data, LazyData)
+
+        window = {}
+        for data_folder in self.data.keys():
+            folder = data_folder
+            if self.metadata.get('segments'):
+                folder = data_folder.rsplit('_', 1)[0]
+            if folders and folder not in folders \
+                    and data_folder not in folders:
+                continue
+
+            for t in self.data[data_folder].keys():
+                if types and t not in types:
+                    continue
+
+                loc = self.data[data_folder].locs.get(t) if lazy else None
+                # offset indexes cover CSVs; binary streams decode whole
+                if isinstance(loc, str) and loc.endswith('.csv') \
+                        and not self.data.transforms \
+                        and not self.data.is_loaded(data_folder, t):
+                    s3_creds = None
+                    if loc.startswith('s3://'):
+                        s3_creds = self.s3
+                    df = read_window(
+                        loc, tz, start, end, s3_creds=s3_creds, **kwargs
+                    )
+                else:
+                    if lazy:
+                        df = self.data.peek(data_folder, t)
+                    else:
+                        df = self.data[data_folder][t]
+                    ts = stream_ts(df)
+                    rows = slice(
+                        np.searchsorted(ts, start), np.searchsorted(ts, end)
+                    )
+                    if isinstance(df, Stream):
+                        df = df.iloc(rows.start, rows.stop)
+                    else:
+                        df = df.iloc[rows]
+
+                if data_folder not in window:
+                    window[data_folder] = {}
+                window[data_folder][t] = df
+
+        return window
+
+    def data_folders(self, folder):
+        """ Returns the data folders holding folder, in segment order. """
+        if self.metadata.get('segments') and \
+                folder in self.metadata['folders']:
+            return [f"{folder}_{i}" for i in range(self.metadata['segments'])]
+        return [folder]
+
+    def stream(self, folder, t):
+        """ Return all segments of folder's type t as one SegmentedStream.
+
+        The stream views the segment DataFrames' arrays without copying
+        when each holds a single value block, as frames read with
+        parser='mc10' do; call its to_pandas method for a contiguous copy.
+        """
+        return SegmentedStream.fromframes(
+            [self.data[d][t] for d in self.data_folders(folder)]
+        )
+
+    def iter_stream_chunks(self, data_folder, t, rows=CHUNK_ROWS, **kwargs):
+        """ Yields one data folder's stream in chunks of up to rows rows.
+
+        Unread streams of a lazy Session are parsed incrementally from
+        their local, S3 or in-memory source; other streams are yielded as
+        views of the DataFrame in memory.
+        """
+        if isinstance(self.data, LazyData) and not self.data.transforms \
+                and not self.data.is_loaded(data_folder, t):
+            loc = self.data[data_folder].locs[t]
+            s3_creds = None
+            if isinstance(loc, str) and loc.startswith('s3://'):
+                s3_creds = self.s3
+            yield from iter_stream(
+                loc,
+                timezone(self.metadata['timezone']),
+                rows=rows,
+                s3_creds=s3_creds,
+                **kwargs
+            )
+        elif isinstance(self.data, LazyData):
+            yield from iter_frame(
+                as_frame(self.data.peek(data_folder, t)), rows
+            )
+        else:
+            yield from iter_frame(as_frame(self.data[data_folder][t]), rows)
+
+    def iter_chunks(self, folder, t, rows=None, duration=None, **kwargs):
+        """ Yield a stream as time ordered DataFrame chunks.
+
+        Segments of a folder (folder_0, folder_1, ...) are stitched in
+        order, so memory use is bounded by the chunk size rather than the
+        recording length.
 
-    def date_shift(self, target_date):
+        Parameters:
+            folder (string): Folder (all segments) or data folder name.
+            t (string): Data type ('accel', 'elec' or 'gyro').
+
+        Keyword Arguments:
+            rows (int): Rows per chunk.
+            duration (timedelta-like or float): Chunk length, as a
+                Timedelta, string such as '10min' or number of seconds.
+                Chunks are aligned to the first sample.
+            **kwargs: Parser options (parser, precision) for unread
+                streams.
+
+        Yields:
+            DataFrame: Consecutive chunks with a tz-aware index.
+        """
+        if (rows is None) == (duration is None):
+            raise ValueError("Specify exactly one of rows or duration.")
+
+        def chunks(rows):
+            for data_folder in self.data_folders(folder):
+                yield from self.iter_stream_chunks(
+                    data_folder, t, rows=rows, **kwargs
+                )
+
+        if rows is not None:
+            return rechunk_rows(chunks(rows), rows)
+        return rechunk_duration(chunks(CHUNK_ROWS), to_duration_us(duration))
+
+    def align(
+        self, rate=None, reference=None, method='nearest', tolerance=None,
+        folders=None, types=None, rows=CHUNK_ROWS
+    ):
+        """ Resample every folder/type onto one uniform time grid.
+
+        The grid runs at rate Hz over the reference sensor's recording.
+        Streams are sampled with vectorized searches on their int64
+        timestamps, rows grid times at a time; segments are sampled
+        separately, so grid times between segments or outside a stream
+        are NaN.
+
+        Keyword Arguments:
+            rate (float): Grid rate in Hz, defaulting to the reference
+                sensor's first sampling rate.
+            reference (string): Label or folder whose recording spans the
+                grid, defaulting to metadata['time_comp'] or the first
+                folder.
+            method (string): 'nearest' sample or 'linear' interpolation.
+            tolerance (float or string): Largest distance to the nearest
+                sample, in seconds or as a pandas Timedelta string, beyond
+                which values are NaN.
+            folders (list of strings): Folders to include, default all.
+            types (list of strings): Data types to include, default all.
+            rows (int): Grid times processed per chunk.
+
+        Returns:
+            DataFrame: One column per sensor axis, named from labels and
+                accel_labels, indexed by the grid times.
+        """
+        labels = self.metadata.get('labels') or self.metadata['folders']
+        label_of = dict(zip(self.metadata['folders'], labels))
+        reference = reference or self.metadata.get('time_comp') or labels[0]
+        i = labels.index(reference) if reference in labels \
+            else self.metadata['folders'].index(reference)
+        ref_folder = self.metadata['folders'][i]
+        if rate is None:
+            rate = self.metadata['sampling_rates'][i][0]
+        if tolerance is not None:
+            tolerance = to_duration_us(tolerance)
+
+        streams = []
+        for j, folder in enumerate(self.metadata['folders']):
+            if folders is not None and folder not in folders:
+                continue
+            for t, mask in zip(TYPES, MASKS):
+                if self.metadata['types'][j] & mask and \
+                        (types is None or t in types):
+                    streams.append((folder, t, self.stream(folder, t)))
+
+        ref = self.stream(ref_folder, next(
+            t for t, m in zip(TYPES, MASKS) if self.metadata['types'][i] & m
+        ))
+        grid = uniform_grid(ref.start, ref.end, rate)
+
+        names = []
+        widths = []
+        dtype = np.float32
+        for folder, t, stream in streams:
+            names += column_names(
+                label_of[folder], t, stream.columns,
+                self.metadata.get('accel_labels')
+            )
+            widths.append(len(stream.columns))
+            for v in stream.values:
+                dtype = np.promote_types(dtype, v.dtype)
+        values = np.full((len(grid), len(names)), np.nan, dtype=dtype)
+
+        col = 0
+        for (_, _, stream), width in zip(streams, widths):
+            for ts, v in zip(stream.ts, stream.values):
+                interpolate(
+                    ts, v, grid, method=method, tolerance=tolerance,
+                    out=values[:, col:col + width], rows=rows
+                )
+            col += width
+
+        return to_frame(
+            grid, values, names, ref.index_name,
+            timezone(self.metadata['timezone'])
+        )
+
+    def annotation_index(self, **kwargs):
+        """ Returns an AnnotationIndex over the Session annotations.
+
+        Keyword arguments (start, stop, name, unit) name the annotation
+        columns; the defaults match MC10 annotation exports.
+        """
+        if self.annotations is None:
+            raise Exception("Session must have annotations.")
+        return AnnotationIndex(
+            self.annotations, timezone(self.metadata['timezone']), **kwargs
+        )
+
+    def events(self, name, folder, t, before=0, after=0, index=None):
+        """ Returns folder's type t data within every annotation called name.
+
+        Parameters:
+            name (string): Annotation name, e.g. one of ann_names, or None
+                for all annotations.
+            folder (string): Folder to extract from, across its segments.
+            t (string): Data type to extract.
+
+        Keyword Arguments:
+            before (float or string): Padding before each annotation, in
+                seconds or as a pandas Timedelta string.
+            after (float or string): Padding after each annotation.
+            index (AnnotationIndex): Index to use, e.g. one built with
+                other column names; built with the defaults if None.
+
+        Returns:
+            list of DataFrames: Data of each annotation, in start order.
+        """
+        index = index or self.annotation_index()
+        return [
+            s.to_pandas() for s in index.extract(
+                self.stream(folder, t),
+                name,
+                before=to_duration_us(before),
+                after=to_duration_us(after)
+            )
+        ]
+
+    def overview(self, folder, t, persist=True, **kwargs):
+        """ Returns the min/max/mean overview pyramid of folder's type t.
+
+        Query the result with a time span and pixel budget to draw a whole
+        recording, or any zoom into it, from a few thousand buckets. Each
+        segment's pyramid is built in one chunked pass over its stream;
+        for unread streams of a lazy Session it is saved next to the
+        stream file (<folder>/<type>.overview.npz) and read back instead
+        while that file is unchanged, as are the overviews written by
+        dump(overview=True). Results are kept until the Session is reloaded
+        or date shifted.
+
+        Parameters:
+            folder (string): Folder (all segments) or data folder name.
+            t (string): Data type ('accel', 'elec' or 'gyro').
+
+        Keyword Arguments:
+            persist (bool): set False to skip saving newly built overviews.
+            **kwargs: Parser options (parser, precision) for unread
+                streams.
+
+        Returns:
+            overview.Overview: Pyramid of every segment of the stream.
+        """
+        if (folder, t) not in self.overviews:
+            self.overviews[(folder, t)] = Overview.concat(
+                [
+                    self.segment_overview(data_folder, t, persist, **kwargs)
+                    for data_folder in self.data_folders(folder)
+                ],
+                timezone(self.metadata['timezone'])
+            )
+        return self.overviews[(folder, t)]
+
+    def segment_overview(self, data_folder, t, persist=True, **kwargs):
+        """ Returns the overview of one data folder's stream, see overview.
+        """
+        tz = timezone(self.metadata['timezone'])
+        loc = None
+        if isinstance(self.data, LazyData) and not self.data.transforms \
+                and not self.data.is_loaded(data_folder, t):
+            loc = self.data[data_folder].locs[t]
+        if not isinstance(loc, str):
+            return Overview.fromframes(
+                self.iter_stream_chunks(data_folder, t, **kwargs), tz
+            )
+
+        fs = s3_filesystem(self.s3) if loc.startswith('s3://') else None
+        path = sidecar_path(loc, t)
+        version = file_version(loc, fs)
+        try:
+            with open_path(path, 'rb', fs) as f:
+                overview, saved = Overview.frombytes(f.read(), tz)
+            if saved == version:
+                return overview
+        except (OSError, KeyError, ValueError):
+            pass
+
+        overview = Overview.fromframes(
+            self.iter_stream_chunks(data_folder, t, **kwargs), tz
+        )
+        if persist:
+            try:
+                with open_path(path, 'wb', fs) as f:
+                    f.write(overview.tobytes(version))
+            except OSError:
+                pass
+        return overview
+
+    def sampling_rate(self, folder, t):
+        """ Returns the sampling rate in Hz of folder's type t. """
+        i = self.metadata['folders'].index(folder)
+        present = [
+            name for name, mask in zip(TYPES, MASKS)
+            if self.metadata['types'][i] & mask
+        ]
+        return self.metadata['sampling_rates'][i][present.index(t)]
+
+    def features(
+        self, window, step=None, features=FEATURES, folders=None,
+        types=None, workers=None, rows=CHUNK_ROWS, **kwargs
+    ):
+        """ Compute window features over every stream.
+
+        Windows are strided views over each segment, read in chunks of
+        rows rows (parsed incrementally for unread streams of a lazy
+        Session), and streams are processed concurrently.
+
+        Parameters:
+            window (float or string): Window length, in seconds or as a
+                pandas Timedelta string, converted to samples with each
+                stream's sampling rate.
+
+        Keyword Arguments:
+            step (float or string): Time between window starts, default
+                window (no overlap).
+            features (list of strings): Features from features.FEATURES.
+            folders (list of strings): Folders to include, default all.
+            types (list of strings): Data types to include, default all.
+            workers (int): Number of streams processed concurrently.
+            rows (int): Rows read per chunk.
+            **kwargs: Parser options for unread lazy streams.
+
+        Returns:
+            DataFrame: One row per window with its folder, segment, type
+                and start time, and one column per feature and axis.
+        """
+        step = window if step is None else step
+        accel_labels = self.metadata.get('accel_labels')
+        tz = timezone(self.metadata['timezone'])
+
+        jobs = []
+        for j, folder in enumerate(self.metadata['folders']):
+            if folders is not None and folder not in folders:
+                continue
+            for t, mask in zip(TYPES, MASKS):
+                if not self.metadata['types'][j] & mask or \
+                        (types is not None and t not in types):
+                    continue
+                rate = self.sampling_rate(folder, t)
+                w, s = [
+                    max(1, int(round(to_duration_us(d) * rate / 10**6)))
+                    for d in [window, step]
+                ]
+                for data_folder in self.data_folders(folder):
+                    jobs.append((folder, data_folder, t, w, s))
+
+        def run(folder, data_folder, t, w, s):
+            chunks = self.iter_stream_chunks(data_folder, t, rows, **kwargs)
+            first = next(chunks, None)
+            if first is None:
+                return None
+            columns = list(first.columns)
+            axes = accel_labels if accel_labels and \
+                len(accel_labels) == len(columns) else columns
+            df = stream_features(
+                chain([first], chunks), w, s, axes, tz, features
+            )
+            df.insert(0, 'type', t)
+            df.insert(0, 'segment', data_folder)
+            df.insert(0, 'folder', folder)
+            return df
+
+        frames = map_ordered(run, jobs, workers=workers)
+        return pd.concat(
+            [df for df in frames if df is not None],
+            ignore_index=True,
+            sort=False
+        )
+
+    def date_shift(self, target_date, deferred=False):
         """ Shift all dataframe indexes to start at target_date
 
+        Shifts move each stream by whole calendar days in the Session
+        timezone, keeping local wall-clock times across DST changes.
+
         Parameters:
             target_date (datetime.date): Date to shift data start to.
+
+        Keyword Arguments:
+            deferred (bool): set True to leave the data in memory as is and
+                apply the shift while writing in dump/dump_s3 instead.
         """
 
         # assert this Session is populated
         if not self.data:
             raise Exception("Session must have data.")
 
+        if deferred:
+            self.shift_date = target_date
+            return
+        self.shift_date = None
+
+        shift = partial(shift_frame, target_date=target_date)
+
+        if self.coverage is not None:
+            self.coverage = self.coverage.shifted(target_date)
+        self.overviews = {}
+
+        # streams of a lazy session are shifted as they are read
+        if isinstance(self.data, LazyData):
+            self.data.transform(shift)
+            return
+
         # loop through all dataframes (accel, elec, and gyro)
         for k1 in self.data.keys():
             for k2 in self.data[k1].keys():
-                df = self.data[k1][k2]
-
-                # compute time difference in days and shift each df
-                start_date = df.index[0].date()
-                dt_days = (target_date - start_date).days
-                df.index = df.index.shift(dt_days, freq='D')
+                shift(self.data[k1][k2])
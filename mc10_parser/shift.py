@@ -0,0 +1,128 @@
+""" Vectorized calendar day shifting of MC10 timestamps """
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pytz import timezone, UnknownTimeZoneError
+
+from .stream import Stream
+from .times import index_to_us, us_to_index
+
+DAY_US = 86400 * 10**6
+
+
+@lru_cache(maxsize=None)
+def transitions(tz):
+    """ Returns the UTC offset table of a pytz timezone.
+
+    Returns:
+        np.ndarray: int64 UTC microsecond times each offset starts at.
+        np.ndarray: int64 UTC offsets in microseconds.
+        np.ndarray: bool flags set where the offset is daylight time.
+    """
+    if not hasattr(tz, '_utc_transition_times'):
+        # look up pytz's table for zoneinfo/dateutil zones of the same name
+        try:
+            tz = timezone(str(tz))
+        except UnknownTimeZoneError:
+            pass
+    times = getattr(tz, '_utc_transition_times', None)
+    if not times:
+        offset = tz.utcoffset(pd.Timestamp(0).to_pydatetime())
+        return (
+            np.array([np.iinfo(np.int64).min], dtype=np.int64),
+            np.array([offset // pd.Timedelta(1, 'us')], dtype=np.int64),
+            np.array([False])
+        )
+    return (
+        np.array(times, dtype='datetime64[us]').view(np.int64),
+        np.array([
+            info[0] // pd.Timedelta(1, 'us') for info in tz._transition_info
+        ], dtype=np.int64),
+        np.array([bool(info[1]) for info in tz._transition_info])
+    )
+
+
+def utc_offsets(ts, tz):
+    """ Returns the UTC offsets and DST flags in tz at UTC times ts. """
+    times, offsets, dst = transitions(tz)
+    i = np.searchsorted(times, ts, side='right') - 1
+    return offsets[i], dst[i]
+
+
+def local_date(ts, tz):
+    """ Returns the date in tz of the UTC microsecond timestamp ts. """
+    return us_to_index([ts], tz)[0].date()
+
+
+def day_offset(ts, tz, target_date):
+    """ Returns the whole days from the local date of ts to target_date. """
+    return (target_date - local_date(ts, tz)).days
+
+
+def shift_us(ts, days, tz):
+    """ Shifts sorted UTC microsecond timestamps by days calendar days.
+
+    Local wall-clock times in tz are kept across DST changes. When neither
+    the source nor the shifted span crosses a UTC offset change, this is a
+    single vectorized int64 add; otherwise timestamps are localized again
+    at their shifted wall-clock times.
+
+    Parameters:
+        ts (np.ndarray): Sorted int64 UTC microsecond timestamps.
+        days (int): Days to shift by.
+        tz (pytz.timezone): Timezone whose wall-clock time is kept.
+
+    Returns:
+        np.ndarray: Shifted int64 UTC microsecond timestamps.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    if not len(ts) or not days:
+        return ts.copy()
+
+    delta = days * DAY_US
+    times = transitions(tz)[0]
+    (src_lo, src_hi), _ = utc_offsets(ts[[0, -1]], tz)
+    if src_lo == src_hi and np.searchsorted(times, ts[0], side='right') == \
+            np.searchsorted(times, ts[-1], side='right'):
+        dst_offset = utc_offsets([ts[0] + delta], tz)[0][0]
+        add = delta + src_lo - dst_offset
+        bounds = np.searchsorted(times, ts[[0, -1]] + add, side='right')
+        if bounds[0] == bounds[1] and \
+                utc_offsets([ts[0] + add], tz)[0][0] == dst_offset:
+            return ts + add
+
+    offsets, dst = utc_offsets(ts, tz)
+    wall = pd.DatetimeIndex((ts + offsets + delta).astype('datetime64[us]'))
+    return index_to_us(
+        wall.tz_localize(tz, ambiguous=dst, nonexistent='shift_forward')
+    )
+
+
+def shift_index(index, days, tz=None):
+    """ Returns a tz-aware DatetimeIndex shifted by days calendar days. """
+    tz = tz or index.tz
+    return us_to_index(
+        shift_us(index_to_us(index), days, tz), tz, name=index.name
+    )
+
+
+def shift_frame(df, target_date):
+    """ Shift the index of df in place so that it starts on target_date.
+
+    df may be a DataFrame or a Stream.
+    """
+    if not len(df):
+        return
+    if isinstance(df, Stream):
+        df.ts = shift_us(
+            df.ts, day_offset(df.ts[0], df.tz, target_date), df.tz
+        )
+        return
+    tz = df.index.tz
+    ts = index_to_us(df.index)
+    df.index = us_to_index(
+        shift_us(ts, day_offset(ts[0], tz, target_date), tz),
+        tz,
+        name=df.index.name
+    )
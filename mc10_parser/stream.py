@@ -0,0 +1,292 @@
+""" Logical views over MC10 sensor streams """
+
+import numpy as np
+import pandas as pd
+
+from .times import index_to_us, timestamp_to_us, us_to_index
+
+
+class Stream:
+    """ One sensor stream held as raw arrays.
+
+    Timestamps are kept as int64 UTC microseconds and values as a single
+    (rows, columns) matrix of any dtype, without the per-object overhead of
+    a DataFrame and its tz-aware index. to_pandas wraps the arrays in a
+    DataFrame without copying the values.
+    """
+
+    __slots__ = ['ts', 'values', 'columns', 'tz', 'index_name']
+
+    def __init__(self, ts, values, columns, tz, index_name=None):
+        """ Initialize Stream.
+
+        Parameters:
+            ts (np.ndarray): int64 UTC microsecond timestamps.
+            values (np.ndarray): (rows, columns) value matrix.
+            columns (list of strings): Value column names.
+            tz (pytz.timezone): Timezone of the stream.
+
+        Keyword Arguments:
+            index_name (string): Name of the timestamp index.
+        """
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.columns = list(columns)
+        self.values = np.asarray(values).reshape(
+            len(self.ts), len(self.columns)
+        )
+        self.tz = tz
+        self.index_name = index_name
+
+    @classmethod
+    def fromframe(cls, df, dtype=None):
+        """ Initialize Stream from a DataFrame with a tz-aware index. """
+        values = df.to_numpy()
+        if dtype is not None:
+            values = values.astype(dtype, copy=False)
+        return cls(
+            index_to_us(df.index), values, df.columns, df.index.tz,
+            index_name=df.index.name
+        )
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        """ Bytes held by the timestamp and value arrays. """
+        return self.ts.nbytes + self.values.nbytes
+
+    @property
+    def index(self):
+        """ tz-aware DatetimeIndex of the timestamps. """
+        return us_to_index(self.ts, self.tz, name=self.index_name)
+
+    def iloc(self, start=None, stop=None):
+        """ Returns a Stream view of positions [start, stop). """
+        rows = slice(start, stop)
+        return Stream(
+            self.ts[rows], self.values[rows], self.columns, self.tz,
+            index_name=self.index_name
+        )
+
+    def loc(self, start=None, end=None):
+        """ Returns a view of the rows with start <= timestamp < end.
+
+        Naive times are taken to be in the stream timezone; ints are UTC
+        microseconds.
+        """
+        bounds = [
+            None if t is None else int(np.searchsorted(
+                self.ts,
+                t if isinstance(t, (int, np.integer))
+                else timestamp_to_us(t, self.tz)
+            ))
+            for t in [start, end]
+        ]
+        return self.iloc(*bounds)
+
+    def to_pandas(self):
+        """ Returns the stream as a DataFrame over the same value array. """
+        return pd.DataFrame(
+            self.values, index=self.index, columns=self.columns, copy=False
+        )
+
+    def __repr__(self):
+        return (
+            f"Stream({len(self)} rows, columns={self.columns}, "
+            f"dtype={self.values.dtype})"
+        )
+
+
+def as_frame(stream):
+    """ Returns a DataFrame for a DataFrame or a Stream. """
+    return stream.to_pandas() if isinstance(stream, Stream) else stream
+
+
+def stream_ts(stream):
+    """ Returns int64 UTC microsecond timestamps of a DataFrame or Stream. """
+    if isinstance(stream, Stream):
+        return stream.ts
+    return index_to_us(stream.index)
+
+
+class SegmentedStream:
+    """ All segments of one folder/type presented as a single stream.
+
+    Segment timestamps and values are kept as the underlying arrays, with a
+    boundary index mapping stream positions to segments. Slicing by time or
+    position crosses segment boundaries without copying; a contiguous copy
+    is only made by to_pandas.
+    """
+
+    def __init__(self, ts, values, columns, tz, index_name=None):
+        """ Initialize SegmentedStream.
+
+        Parameters:
+            ts (list of np.ndarray): int64 UTC microsecond timestamps for
+                each segment, in time order.
+            values (list of np.ndarray): (rows, columns) value matrix for
+                each segment.
+            columns (list of strings): Value column names.
+            tz (pytz.timezone): Timezone of the stream.
+
+        Keyword Arguments:
+            index_name (string): Name of the timestamp index.
+        """
+        assert(len(ts) == len(values))
+        self.ts = [np.asarray(t) for t in ts]
+        self.values = [np.asarray(v) for v in values]
+        self.columns = list(columns)
+        self.tz = tz
+        self.index_name = index_name
+        # bounds[i] is the stream position of the first row of segment i
+        self.bounds = np.concatenate(
+            ([0], np.cumsum([len(t) for t in self.ts]))
+        ).astype(np.int64)
+
+    @classmethod
+    def fromframes(cls, frames):
+        """ Initialize SegmentedStream from time ordered DataFrames.
+
+        Streams may be given in place of DataFrames.
+        """
+        assert(len(frames) > 0)
+        first = frames[0]
+        if isinstance(first, Stream):
+            tz, index_name = first.tz, first.index_name
+        else:
+            tz, index_name = first.index.tz, first.index.name
+        return cls(
+            [stream_ts(df) for df in frames],
+            [df.values if isinstance(df, Stream) else df.to_numpy()
+             for df in frames],
+            first.columns,
+            tz,
+            index_name=index_name
+        )
+
+    def __len__(self):
+        return int(self.bounds[-1])
+
+    @property
+    def start(self):
+        """ First timestamp, in UTC microseconds. """
+        return self.ts[0][0] if len(self) else None
+
+    @property
+    def end(self):
+        """ Last timestamp, in UTC microseconds. """
+        return self.ts[-1][-1] if len(self) else None
+
+    def segment_of(self, position):
+        """ Returns (segment, offset within segment) for a position. """
+        i = int(np.searchsorted(self.bounds, position, side='right')) - 1
+        return i, position - int(self.bounds[i])
+
+    def position_of(self, t):
+        """ Returns the first stream position with timestamp >= t. """
+        if not isinstance(t, (int, np.integer)):
+            t = timestamp_to_us(t, self.tz)
+        for i, ts in enumerate(self.ts):
+            if len(ts) and ts[-1] >= t:
+                return int(self.bounds[i] + np.searchsorted(ts, t))
+        return len(self)
+
+    def positions_of(self, times, side='left'):
+        """ Returns stream positions for int64 UTC microsecond times.
+
+        The vectorized form of position_of: with side='left' the first
+        position with timestamp >= t, with side='right' the first with
+        timestamp > t.
+        """
+        times = np.asarray(times, dtype=np.int64)
+        out = np.full(len(times), len(self), dtype=np.int64)
+        pending = np.ones(len(times), dtype=bool)
+        for i, ts in enumerate(self.ts):
+            if not len(ts):
+                continue
+            if side == 'left':
+                here = pending & (times <= ts[-1])
+            else:
+                here = pending & (times < ts[-1])
+            out[here] = self.bounds[i] + np.searchsorted(
+                ts, times[here], side=side
+            )
+            pending &= ~here
+        return out
+
+    def iloc(self, start=None, stop=None):
+        """ Returns a SegmentedStream view of positions [start, stop). """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        ts, values = [], []
+        for i in range(len(self.ts)):
+            lo = max(start, int(self.bounds[i])) - int(self.bounds[i])
+            hi = min(stop, int(self.bounds[i + 1])) - int(self.bounds[i])
+            if hi > lo:
+                ts.append(self.ts[i][lo:hi])
+                values.append(self.values[i][lo:hi])
+        return SegmentedStream(
+            ts, values, self.columns, self.tz, index_name=self.index_name
+        )
+
+    def loc(self, start=None, end=None):
+        """ Returns a view of the rows with start <= timestamp < end.
+
+        Naive times are taken to be in the stream timezone; ints are UTC
+        microseconds.
+        """
+        first = 0 if start is None else self.position_of(start)
+        last = len(self) if end is None else self.position_of(end)
+        return self.iloc(first, last)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step is not None:
+                raise ValueError("SegmentedStream slices take no step.")
+            positional = (int, np.integer, type(None))
+            if isinstance(key.start, positional) and \
+                    isinstance(key.stop, positional):
+                return self.iloc(key.start, key.stop)
+            return self.loc(key.start, key.stop)
+        raise TypeError("SegmentedStream supports slicing only.")
+
+    def segments(self):
+        """ Yields each segment as a DataFrame view. """
+        for ts, values in zip(self.ts, self.values):
+            yield pd.DataFrame(
+                values,
+                index=us_to_index(ts, self.tz, name=self.index_name),
+                columns=self.columns,
+                copy=False
+            )
+
+    def timestamps(self):
+        """ Returns a contiguous copy of all timestamps. """
+        return np.concatenate(self.ts) if self.ts else \
+            np.empty(0, dtype=np.int64)
+
+    def to_pandas(self):
+        """ Returns the whole stream as one contiguous DataFrame copy. """
+        if not self.ts:
+            return pd.DataFrame(
+                np.empty((0, len(self.columns))),
+                index=us_to_index([], self.tz, self.index_name),
+                columns=self.columns
+            )
+        return pd.DataFrame(
+            np.concatenate(self.values),
+            index=us_to_index(self.timestamps(), self.tz, self.index_name),
+            columns=self.columns,
+            copy=False
+        )
+
+    def __repr__(self):
+        return (
+            f"SegmentedStream({len(self)} rows in {len(self.ts)} segments, "
+            f"columns={self.columns})"
+        )
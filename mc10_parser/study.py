@@ -0,0 +1,146 @@
+""" Study-wide loading of MC10 subject Sessions """
+
+import os
+
+from .dataio import imap_bounded
+from .s3context import S3Context, list_prefix
+from .session import Session
+
+METADATA = 'metadata.json'
+
+
+def load_session(path, bucket_name=None, s3=None, **kwargs):
+    """ Loads the Session of one metadata file, locally or from S3. """
+    if bucket_name is None:
+        return Session.fromlocal(path, **kwargs)
+    return Session.froms3(bucket_name, None, None, path, s3=s3, **kwargs)
+
+
+def apply_session(fn, path, bucket_name, s3, kwargs):
+    """ Loads the Session at path and returns fn(session). """
+    return fn(load_session(path, bucket_name=bucket_name, s3=s3, **kwargs))
+
+
+class Study:
+    """ Every subject Session under a local or S3 study prefix.
+
+    Sessions are loaded on demand, one subject at a time or across a pool
+    of workers, so a study never needs to fit in memory at once.
+    """
+
+    def __init__(self, paths, root='', bucket_name=None, s3=None, **kwargs):
+        """ Initialize Study.
+
+        Parameters:
+            paths (list of strings): Subject metadata.json paths or keys.
+
+        Keyword Arguments:
+            root (string): Study prefix the paths are under.
+            bucket_name (string): S3 bucket, None for local paths.
+            s3 (S3Context): S3 clients shared by every Session load.
+            **kwargs: Load options passed through to every Session load.
+        """
+        self.paths = sorted(paths)
+        self.root = root
+        self.bucket_name = bucket_name
+        self.s3 = s3
+        self.load_kwargs = kwargs
+
+    @classmethod
+    def fromlocal(cls, path, **kwargs):
+        """ Initialize Study from every metadata.json under directory path.
+
+        Additional keyword arguments are passed through to dataio.load.
+        """
+        root = os.path.join(path, '')
+        paths = [
+            os.path.join(d, METADATA)
+            for d, _, files in os.walk(root) if METADATA in files
+        ]
+        return cls(paths, root=root, **kwargs)
+
+    @classmethod
+    def froms3(
+        cls, bucket_name, prefix, access_key=None, secret_key=None, s3=None,
+        **kwargs
+    ):
+        """ Initialize Study from every metadata.json under an S3 prefix.
+
+        Pass a shared S3Context as s3 to reuse its pooled clients.
+        Additional keyword arguments are passed through to dataio.load.
+        """
+        if s3 is None:
+            s3 = S3Context(access_key, secret_key)
+        root = prefix.rstrip('/') + '/' if prefix else ''
+        keys, _ = list_prefix(s3.client, bucket_name, root)
+        paths = [
+            k for k in keys if k == METADATA or k.endswith('/' + METADATA)
+        ]
+        return cls(paths, root=root, bucket_name=bucket_name, s3=s3, **kwargs)
+
+    @property
+    def subjects(self):
+        """ Subject folder of each metadata file, relative to the root. """
+        return [
+            os.path.dirname(p[len(self.root):]) or '.' for p in self.paths
+        ]
+
+    def __len__(self):
+        return len(self.paths)
+
+    def session(self, subject):
+        """ Loads the Session of one subject folder. """
+        path = self.paths[self.subjects.index(subject)]
+        return load_session(
+            path, bucket_name=self.bucket_name, s3=self.s3,
+            **self.load_kwargs
+        )
+
+    def __iter__(self):
+        """ Yields each subject Session in turn, loading one at a time. """
+        for path in self.paths:
+            yield load_session(
+                path, bucket_name=self.bucket_name, s3=self.s3,
+                **self.load_kwargs
+            )
+
+    def imap(self, fn, workers=None, executor='process'):
+        """ Applies fn to every Session, yielding results in subject order.
+
+        Each worker loads a Session and returns only fn(session), with at
+        most twice workers subjects in flight, so memory is bounded by the
+        worker count rather than the study size.
+
+        Parameters:
+            fn (function): Called with each Session. Must be picklable,
+                e.g. a module-level function, for the process executor.
+
+        Keyword Arguments:
+            workers (int): Number of pool workers, defaulting to the number
+                of CPUs. 1 runs serially.
+            executor (string or concurrent.futures.Executor): 'process',
+                'thread' or an existing executor to submit to.
+
+        Yields:
+            tuple: (subject, fn(session)) for each subject.
+        """
+        if workers is None:
+            workers = os.cpu_count()
+        jobs = (
+            (subject, (fn, path, self.bucket_name, self.s3, self.load_kwargs))
+            for subject, path in zip(self.subjects, self.paths)
+        )
+        yield from imap_bounded(
+            apply_session, jobs, workers=workers, executor=executor
+        )
+
+    def map(self, fn, workers=None, executor='process'):
+        """ Returns fn(session) for every subject, in subject order.
+
+        See imap for the arguments.
+        """
+        return [
+            result for _, result in self.imap(
+                fn, workers=workers, executor=executor
+            )
+        ]
@@ -0,0 +1,25 @@
+""" Conversions between MC10 microsecond timestamps and pandas indexes """
+
+import numpy as np
+import pandas as pd
+
+
+def us_to_index(ts, tz, name=None):
+    """ Builds a tz-aware DatetimeIndex from int64 UTC microseconds. """
+    return pd.DatetimeIndex(
+        pd.to_datetime(np.asarray(ts, dtype=np.int64), unit='us', utc=True),
+        name=name
+    ).tz_convert(tz)
+
+
+def timestamp_to_us(t, tz):
+    """ Returns int64 UTC microseconds for t, localizing naive times to tz. """
+    t = pd.Timestamp(t)
+    if t.tzinfo is None:
+        t = t.tz_localize(tz)
+    return t.value // 1000
+
+
+def index_to_us(index):
+    """ Returns int64 UTC microseconds for a tz-aware DatetimeIndex. """
+    return index.values.astype('datetime64[us]', copy=False).view(np.int64)
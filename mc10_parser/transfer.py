@@ -0,0 +1,616 @@
+""" Pipelined, rate-limited transfer of MC10 cloud studies to S3 """
+
+from collections import OrderedDict
+import datetime
+import json
+import queue
+import threading
+from time import monotonic, sleep
+import zipfile
+
+import requests
+
+from .dataio import SPOOL_BYTES, spool
+from .s3context import list_prefix
+from .s3upload import ACL
+from .session import Session
+
+API_URL = 'https://mc10cloud.com/api'
+RATE = 10
+SHIFT_DATE = datetime.date(2000, 1, 1)
+MAX_BYTES = 2 << 30
+QUEUE_SIZE = 2
+CHUNK_BYTES = 1 << 20
+WORKERS = {'api': 4, 'download': 4, 'parse': 2, 'shift': 1, 'upload': 4}
+PIPELINE_ID = 'fdd051b8-d753-11e6-ab51-34363bc84032'
+MASTER_ID = '4e8a80fd-4778-11e6-a313-34363bc3dbe2'
+CHANNEL_INTERVAL = 1000
+
+JSON_HEADERS = {'Content-Type': 'text/json'}
+CSV_HEADERS = {'Content-Type': 'text/csv'}
+MANIFEST = 'transfer.json'
+
+STOP = object()
+
+
+class TokenBucket:
+    """ Thread-safe token bucket limiting requests to rate per second. """
+
+    def __init__(self, rate=RATE, burst=1):
+        """ Initialize TokenBucket.
+
+        Keyword Arguments:
+            rate (float): Tokens added per second.
+            burst (int): Most tokens held at once.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """ Blocks until a token is available and takes it. """
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.last) * self.rate
+                )
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+
+class MemoryBudget:
+    """ Caps the bytes held by in-flight recordings.
+
+    Subjects are admitted while fewer than max_bytes are held; the
+    recordings of an admitted subject are then always downloaded, so one
+    large subject cannot stall the transfer. Bytes held may therefore
+    exceed max_bytes by at most one subject per download worker.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.cond = threading.Condition()
+
+    def admit(self):
+        """ Blocks until fewer than max_bytes are held. """
+        with self.cond:
+            while self.used >= self.max_bytes:
+                self.cond.wait()
+
+    def reserve(self, n):
+        """ Counts n more bytes as held. """
+        with self.cond:
+            self.used += n
+
+    def release(self, n):
+        """ Returns n held bytes to the budget. """
+        with self.cond:
+            self.used -= n
+            self.cond.notify_all()
+
+
+class MC10Client:
+    """ Rate-limited client for the MC10 cloud API. """
+
+    def __init__(self, base_url=API_URL, limiter=None, session=None):
+        """ Initialize MC10Client.
+
+        Keyword Arguments:
+            base_url (string): API root, e.g. a local stand-in for testing.
+            limiter (TokenBucket): Limiter shared by every API request,
+                10 requests per second by default.
+            session (requests.Session): HTTP session to reuse connections.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.limiter = limiter or TokenBucket()
+        self.session = session or requests.Session()
+        self.auth = None
+        self.account_id = None
+
+    def request(
+        self, path, headers=JSON_HEADERS, data=None, req_type='get',
+        load_method='json'
+    ):
+        """ GET or POST an API path, waiting for the rate limiter first. """
+        self.limiter.acquire()
+        response = self.session.request(
+            req_type,
+            f"{self.base_url}{path}",
+            headers=headers,
+            auth=self.auth,
+            data=data
+        )
+        response.raise_for_status()
+        if load_method == 'json':
+            return json.loads(response.text)
+        return response.text
+
+    def login(self, username, password):
+        """ Authenticate and keep the access token for later requests. """
+        auth_data = json.dumps({
+            'email': username, 'password': password, 'accountType': 'BRC2'
+        })
+        response = self.request(
+            '/v1/users/login/email', data=auth_data, req_type='post'
+        )
+        self.auth = (response['user']['id'], response['accessToken'])
+        self.account_id = response['user']['accountId']
+
+    def study(self, name):
+        """ Returns the full description of the study called name. """
+        studies = self.request(f"/v1/accounts/{self.account_id}/studies")
+        matches = [s for s in studies if s['displayName'] == name]
+        if not matches:
+            raise ValueError(f"Unknown study {name}.")
+        return {
+            **matches[0], **self.request(f"/v1/studies/{matches[0]['id']}")
+        }
+
+    def subjects(self, study_id):
+        """ Returns all subjects of a study. """
+        return self.request(f"/v1/studies/{study_id}/subjects")['items']
+
+    def recordings(self, study_id, subject_id):
+        """ Returns the recordings of a subject in start time order. """
+        return self.request(
+            f"/v1/studies/{study_id}/subjects/{subject_id}/recordings"
+        )['items']
+
+    def export_link(self, rec):
+        """ Returns the download link of a recording's export zip. """
+        return self.request(rec['export']['href'])['href']
+
+    def annotations(self, study_id, subject_id):
+        """ Returns the annotations CSV text of a subject. """
+        return self.request(
+            f"/v1/archives/{study_id}/subjects/{subject_id}/annotations",
+            CSV_HEADERS,
+            load_method='csv'
+        )
+
+    def metrics(self, study_id, subject_id):
+        """ Returns the pipeline metrics of a subject. """
+        return self.request(
+            f"/v1/studies/{study_id}/subjects/{subject_id}/pipelines/metrics",
+            CSV_HEADERS
+        )
+
+    def channels(self, study_id, subject_id, start_ts, end_ts):
+        """ Returns the pipeline channels of a subject between two times. """
+        return self.request(
+            f"/v1/studies/{study_id}/subjects/{subject_id}/pipelines/"
+            f"{PIPELINE_ID}/channels?masterId={MASTER_ID}&from={start_ts}"
+            f"&to={end_ts}&interval={CHANNEL_INTERVAL}",
+            CSV_HEADERS
+        )
+
+    def download(self, url):
+        """ Opens a streaming download of an export link.
+
+        Export links point at file storage rather than the API, so they do
+        not count against the rate limit.
+        """
+        response = self.session.get(url, stream=True)
+        response.raise_for_status()
+        return response
+
+
+class Manifest:
+    """ Checkpoint of the subjects a study transfer has completed.
+
+    The manifest is a JSON object at <study path>/transfer.json mapping each
+    transferred subject to the recordings it was transferred with. It is
+    rewritten after every subject upload, so a rerun skips completed
+    subjects and redoes those that failed or gained recordings.
+    """
+
+    def __init__(self, s3, bucket_name, study_path, subjects=None):
+        """ Initialize Manifest.
+
+        Parameters:
+            s3 (S3Context): S3 clients to write with.
+            bucket_name (string): Bucket the study is written to.
+            study_path (string): Key prefix of the study, ending in '/'.
+
+        Keyword Arguments:
+            subjects (dict): Completed subjects, each mapped to its
+                recording ids or None when they are not known.
+        """
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.study_path = study_path
+        self.subjects = subjects or {}
+        self.lock = threading.Lock()
+
+    @property
+    def key(self):
+        return f"{self.study_path}{MANIFEST}"
+
+    @classmethod
+    def load(cls, s3, bucket_name, study_path):
+        """ Reads the manifest of a study, listing the study if it has none.
+
+        Without a manifest, subjects whose metadata.json exists are taken as
+        complete, since Session.dump_s3 writes it after the data files.
+        """
+        m = cls(s3, bucket_name, study_path)
+        try:
+            body = s3.client.get_object(Bucket=bucket_name, Key=m.key)['Body']
+            m.subjects = {
+                name: entry['recordings']
+                for name, entry in json.loads(body.read())['subjects'].items()
+            }
+        except s3.client.exceptions.NoSuchKey:
+            keys, _ = list_prefix(s3.client, bucket_name, study_path)
+            m.subjects = {
+                k[len(study_path):].split('/')[0]: None for k in keys
+                if k.count('/', len(study_path)) == 1
+                and k.endswith('/metadata.json')
+            }
+        return m
+
+    def is_done(self, name, rec_ids=None):
+        """ Returns True if subject name was transferred with rec_ids. """
+        if name not in self.subjects:
+            return False
+        done_ids = self.subjects[name]
+        return done_ids is None or rec_ids is None or done_ids == rec_ids
+
+    def done(self, name, rec_ids):
+        """ Records subject name as transferred and writes the manifest. """
+        with self.lock:
+            self.subjects[name] = rec_ids
+            self.s3.client.put_object(
+                Bucket=self.bucket_name,
+                Key=self.key,
+                ACL=ACL,
+                Body=json.dumps({'subjects': {
+                    name: {'recordings': ids}
+                    for name, ids in sorted(self.subjects.items())
+                }}, indent=4).encode()
+            )
+
+
+def device_template(study):
+    """ Returns the folder base, type and sampling rates of each device.
+
+    Parameters:
+        study (dict): Full study description from the MC10 API.
+
+    Returns:
+        OrderedDict: Device settings keyed by device config id.
+    """
+    template = OrderedDict()
+    for device in study['deviceConfigs']:
+        sensor = device['sensorConfig']
+        device_type = 0
+        sampling_rate = []
+        if 'ACCEL' in sensor['gyro']['mode']:
+            device_type += 1
+            sampling_rate.append(1000. / sensor['gyro']['periodMs'])
+        if sensor.get('afe'):
+            device_type += 2
+            sampling_rate.append(sensor['afe']['rate'])
+        if 'GYRO' in sensor['gyro']['mode']:
+            device_type += 4
+            sampling_rate.append(1000. / sensor['gyro']['periodMs'])
+        template[device['id']] = {
+            'type': device_type,
+            'sampling_rate': sampling_rate,
+            'filename_base': f"{device['physicalConfig']['location']}"
+                             f"_{device['physicalConfig']['side']}".lower(),
+        }
+    return template
+
+
+def recording_layout(recs, template):
+    """ Returns the folders, types and sampling rates of recordings.
+
+    Folders are named after the device location and side, numbered per
+    device in recording order.
+    """
+    # We assume recordings come in ascending, sorted order from MC10
+    timestamps = [rec['recordingStartTs'] for rec in recs]
+    assert(timestamps == sorted(timestamps))
+
+    counts = {k: 0 for k in template}
+    folders, types, sampling_rates = [], [], []
+    for rec in recs:
+        device = template[rec['deviceConfigId']]
+        folder = device['filename_base']
+        side = rec['physicalConfig']['side']
+        if side in ['LEFT', 'RIGHT']:
+            folder = f"{folder}_{side.lower()}"
+        folders.append(f"{folder}_{counts[rec['deviceConfigId']]}")
+        types.append(device['type'])
+        sampling_rates.append(device['sampling_rate'])
+        counts[rec['deviceConfigId']] += 1
+    return folders, types, sampling_rates
+
+
+class Pipeline:
+    """ Stages of worker threads connected by bounded queues.
+
+    Each stage applies its function to items from the previous stage and
+    passes non-None results on, so slow network stages overlap with
+    parsing. A failing item is recorded and dropped without stopping the
+    pipeline.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        """ Initialize Pipeline.
+
+        Keyword Arguments:
+            queue_size (int): Items waiting between two stages at most.
+        """
+        self.queue_size = queue_size
+        self.stages = []
+
+    def add(self, name, fn, workers=1):
+        """ Appends a stage running fn on workers threads. """
+        assert(workers > 0)
+        self.stages.append((name, fn, workers))
+        return self
+
+    def run(self, items, on_error=None):
+        """ Runs items through every stage.
+
+        Parameters:
+            items (iterable): Inputs of the first stage.
+
+        Keyword Arguments:
+            on_error (function): Called with (item, exception) when a stage
+                fails, e.g. to free resources held by the item. Exceptions
+                it raises are recorded as errors of the same item.
+
+        Returns:
+            list: Outputs of the last stage in completion order.
+            list: (stage name, item, exception) of every failed item.
+        """
+        queues = [queue.Queue(self.queue_size) for _ in self.stages]
+        queues.append(queue.Queue())
+        errors = []
+        lock = threading.Lock()
+        running = [workers for _, _, workers in self.stages]
+
+        def fail(name, item, e):
+            with lock:
+                errors.append((name, item, e))
+            if on_error is not None:
+                try:
+                    on_error(item, e)
+                except Exception as cleanup:
+                    with lock:
+                        errors.append((name, item, cleanup))
+
+        def work(i):
+            name, fn, _ = self.stages[i]
+            try:
+                while True:
+                    item = queues[i].get()
+                    if item is STOP:
+                        # leave the marker for the other workers of this stage
+                        queues[i].put(STOP)
+                        break
+                    try:
+                        result = fn(item)
+                    except Exception as e:
+                        fail(name, item, e)
+                        continue
+                    if result is not None:
+                        queues[i + 1].put(result)
+            finally:
+                # downstream stages wait on this marker, so always pass it on
+                with lock:
+                    running[i] -= 1
+                    last = running[i] == 0
+                if last:
+                    queues[i + 1].put(STOP)
+
+        def feed():
+            for item in items:
+                queues[0].put(item)
+            queues[0].put(STOP)
+
+        threads = [threading.Thread(target=feed, daemon=True)] + [
+            threading.Thread(target=work, args=(i,), daemon=True)
+            for i, (_, _, workers) in enumerate(self.stages)
+            for _ in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        results = []
+        while True:
+            result = queues[-1].get()
+            if result is STOP:
+                break
+            results.append(result)
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+
+def transfer_study(
+    client, study_name, s3, bucket_name, outpath, shift_date=SHIFT_DATE,
+    skip=(), resume=True, workers=None, max_bytes=MAX_BYTES,
+    queue_size=QUEUE_SIZE, spool_bytes=SPOOL_BYTES, time=False,
+    load_kwargs=None, dump_kwargs=None
+):
+    """ Transfers every subject of an MC10 study to S3.
+
+    Subjects flow through API, download, parse, shift and upload stages
+    that run concurrently, with every API request sharing the client's
+    rate limiter and in-flight recordings held to about max_bytes. CSVs
+    are parsed straight from the downloaded zips.
+
+    Parameters:
+        client (MC10Client): Logged in MC10 API client.
+        study_name (string): Display name of the study to transfer.
+        s3 (S3Context): Shared S3 clients to upload with.
+        bucket_name (string): S3 bucket to write to.
+        outpath (string): Key prefix; subjects are written to
+            <outpath>/<study>/<subject>/metadata.json.
+
+    Keyword Arguments:
+        shift_date (datetime.date): Date to shift recordings to, None to
+            keep the recorded dates.
+        skip (collection of strings): Subject names to leave out.
+        resume (bool): set True to skip subjects the study's transfer
+            manifest lists as completed with the same recordings.
+        workers (dict): Worker threads per stage, defaulting to WORKERS.
+        max_bytes (int): Uncompressed CSV bytes of the recordings in flight
+            at once, an upper bound on their parsed size.
+        queue_size (int): Subjects waiting between two stages at most.
+        spool_bytes (int): Size above which a downloaded zip is spooled to
+            a temporary file instead of memory.
+        time (bool): set True to print elapsed times.
+        load_kwargs (dict): Options passed through to Session.frommem.
+        dump_kwargs (dict): Options passed through to Session.dump_s3.
+
+    Returns:
+        list: Names of the subjects transferred.
+        list: (stage name, subject name, exception) of failed subjects.
+    """
+    workers = {**WORKERS, **(workers or {})}
+    load_kwargs = load_kwargs or {}
+    dump_kwargs = dump_kwargs or {}
+    budget = MemoryBudget(max_bytes)
+
+    study = client.study(study_name)
+    study_path = f"{outpath}/{study['displayName']}/"
+    template = device_template(study)
+    ann_names = [a['displayName'] for a in study['activities']]
+    manifest = Manifest(s3, bucket_name, study_path)
+    if resume:
+        manifest = Manifest.load(s3, bucket_name, study_path)
+    subjects = [
+        s for s in client.subjects(study['id'])
+        if s['displayName'] not in skip
+        # subjects found by listing have no recording ids to compare
+        and manifest.subjects.get(s['displayName'], []) is not None
+    ]
+    if time:
+        print(f"Checking {len(subjects)} subjects.")
+
+    def fetch(subject):
+        recs = client.recordings(study['id'], subject['id'])
+        rec_ids = [rec['id'] for rec in recs]
+        if len(recs) == 0 or manifest.is_done(subject['displayName'], rec_ids):
+            return None
+        folders, types, sampling_rates = recording_layout(recs, template)
+        return {
+            'subject': subject,
+            'rec_ids': rec_ids,
+            'folders': folders,
+            'links': [client.export_link(rec) for rec in recs],
+            'reserved': 0,
+            'files': [],
+            'metadata': {
+                'meta': 'annotations.csv',
+                'timezone': subject['timezone'],
+                'ann_names': ann_names,
+                'folders': folders,
+                'types': types,
+                'sampling_rates': sampling_rates,
+            },
+            'data': {
+                'meta': client.annotations(study['id'], subject['id']),
+                'metrics': client.metrics(study['id'], subject['id']),
+                'channels': client.channels(
+                    study['id'], subject['id'],
+                    recs[0]['recordingStartTs'], recs[-1]['recordingStopTs']
+                ),
+            },
+        }
+
+    def download(job):
+        budget.admit()
+        rec_files = OrderedDict()
+        for folder, link in zip(job['folders'], job['links']):
+            with client.download(link) as response:
+                f = spool(response.iter_content(CHUNK_BYTES), spool_bytes)
+            job['files'].append(f)
+            # CSVs are parsed straight from the archive
+            # TODO copy error files as well
+            archive = zipfile.ZipFile(f)
+            size = sum(
+                info.file_size for info in archive.infolist()
+                if info.filename.endswith('.csv')
+            )
+            budget.reserve(size)
+            job['reserved'] += size
+            rec_files[folder] = archive
+            if time:
+                print(f"Downloaded {folder} from MC10 cloud")
+        job['data']['data'] = rec_files
+        return job
+
+    def parse(job):
+        job['session'] = Session.frommem(
+            job.pop('metadata'), job.pop('data'), time=time, **load_kwargs
+        )
+        if not load_kwargs.get('lazy'):
+            close_files(job)
+        return job
+
+    def shift(job):
+        if shift_date is not None:
+            # applied while the upload stage writes each file
+            job['session'].date_shift(shift_date, deferred=True)
+        return job
+
+    def upload(job):
+        name = job['subject']['displayName']
+        s = job.pop('session')
+        s.setup_s3(s3=s3)
+        s.dump_s3(
+            bucket_name,
+            f"{study_path}{name}/metadata.json",
+            time=time,
+            **dump_kwargs
+        )
+        manifest.done(name, job['rec_ids'])
+        release(job)
+        if time:
+            print(f"Transferred {name}")
+        return name
+
+    def close_files(job):
+        for f in job['files']:
+            f.close()
+        job['files'] = []
+
+    def release(job):
+        try:
+            close_files(job)
+        finally:
+            budget.release(job['reserved'])
+            job['reserved'] = 0
+
+    def on_error(job, e):
+        if isinstance(job, dict) and 'reserved' in job:
+            release(job)
+            for k in ['data', 'session']:
+                job.pop(k, None)
+
+    pipeline = Pipeline(queue_size)
+    pipeline.add('api', fetch, workers['api'])
+    pipeline.add('download', download, workers['download'])
+    pipeline.add('parse', parse, workers['parse'])
+    pipeline.add('shift', shift, workers['shift'])
+    pipeline.add('upload', upload, workers['upload'])
+    done, errors = pipeline.run(subjects, on_error=on_error)
+    return done, [
+        (stage, job['subject']['displayName'] if 'subject' in job
+         else job['displayName'], e)
+        for stage, job, e in errors
+    ]
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from mc10_parser.features import iter_window_features
+
+
+def features_of(ts, values, window, step, rows):
+    """ Returns the concatenated window starts and features over chunks. """
+    chunks = (
+        (ts[i:i + rows], values[i:i + rows]) for i in range(0, len(ts), rows)
+    )
+    parts = list(iter_window_features(chunks, window, step))
+    starts = np.concatenate([s for s, _ in parts])
+    feats = {
+        f: np.concatenate([p[f] for _, p in parts]) for f in parts[0][1]
+    }
+    return starts, feats
+
+
+@pytest.mark.parametrize('window,step', [(250, 750), (250, 100), (64, 64)])
+@pytest.mark.parametrize('rows', [1, 97, 500, 1000, 4096])
+def test_chunked_matches_unchunked(window, step, rows):
+    rng = np.random.default_rng(0)
+    ts = np.arange(10007, dtype=np.int64) * 4000
+    values = rng.normal(size=(len(ts), 3))
+
+    starts, feats = features_of(ts, values, window, step, len(ts))
+    chunked_starts, chunked = features_of(ts, values, window, step, rows)
+
+    np.testing.assert_array_equal(chunked_starts, starts)
+    for f in feats:
+        np.testing.assert_allclose(chunked[f], feats[f])